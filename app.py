@@ -1,20 +1,13 @@
+import sys
+import startup
 
-from flask import Flask
-from stage1 import stage1_bp
-from stage2 import stage2_bp
-from stage3 import stage3_bp
-from utils import render_page
-
-app = Flask(__name__)
-
-# Register Blueprints
-app.register_blueprint(stage1_bp)
-app.register_blueprint(stage2_bp)
-app.register_blueprint(stage3_bp)
-
-@app.get("/")
-def home():
-    body = """
+# =========================================================
+# APP FACTORY
+# import app เฉย ๆ ไม่โหลด Flask / blueprint อะไรเลย
+# ทุกอย่าง build ตอน create_app() (หรือตอนแตะ app.app ครั้งแรก)
+# dependency หนัก (qrcode/PIL, cryptography) โหลดตอนใช้ครั้งแรกใน module ของแต่ละ stage
+# =========================================================
+HOME_BODY = """
     <div class="grid">
       <div class="card">
         <h1>🛡️ The SUT Secret Server — CTF Lab</h1>
@@ -47,7 +40,85 @@ def home():
       </div>
     </div>
     """
-    return render_page("The SUT Secret Server", body, subtitle="Cyber Lab Interface • Terminal / Neon Theme")
+
+def create_app(preload: bool = None):
+    """
+    Build the Flask app. preload=True also renders the cached pages and derives
+    key material up front: call it in a pre-fork master (wsgi.py) so every
+    worker inherits the result copy-on-write instead of redoing it.
+    """
+    from flask import Flask
+
+    with startup.timed("import blueprints"):
+        from stage1 import stage1_bp
+        from stage2 import stage2_bp
+        from stage3 import stage3_bp
+        from assets import assets_bp
+        from ops import ops_bp
+        from utils import render_page, strong_etag, immutable_response
+        import compression
+        import metrics
+        import tracing
+        import workers
+    from config import RSA_PRELOAD, PRELOAD
+    if preload is None:
+        preload = PRELOAD
+
+    app = Flask(__name__)
+
+    # Register Blueprints
+    with startup.timed("register blueprints"):
+        app.register_blueprint(stage1_bp)
+        app.register_blueprint(stage2_bp)
+        app.register_blueprint(stage3_bp)
+        app.register_blueprint(assets_bp)
+        app.register_blueprint(ops_bp)
+
+    metrics.init_app(app)
+    tracing.init_app(app)
+    with startup.timed("compression warmup"):
+        compression.init_app(app)
+    workers.init_app(app)
+
+    if preload:
+        from stage2.routes import preload_pages as preload_stage2
+        from stage3.routes import preload_pages as preload_stage3
+        from tokens import preload_keys
+        with startup.timed("preload pages"):
+            preload_stage2()
+            preload_stage3()
+        with startup.timed("preload token keys"):
+            preload_keys()
+
+    if preload or RSA_PRELOAD:
+        from stage1.routes import preload_rsa_key
+        with startup.timed("stage1 rsa key"):
+            preload_rsa_key()
+
+    home_page = render_page("The SUT Secret Server", HOME_BODY, subtitle="Cyber Lab Interface • Terminal / Neon Theme")
+    home_etag = strong_etag(home_page)  # strong ETag -> 304 + variant ที่บีบไว้แล้วใน compression cache
+
+    @app.get("/")
+    def home():
+        return immutable_response(home_page, home_etag)
+
+    startup.mark_booted()
+    return app
+
+_app = None
+
+def __getattr__(name):
+    # `from app import app` ยังใช้ได้เหมือนเดิม: build ตอนถูกขอครั้งแรก
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
+    if "--startup-profile" in sys.argv:
+        sys.exit(startup.importtime_profile())
+    app = create_app()
+    startup.report()
     app.run(host="0.0.0.0", port=5001, debug=True)
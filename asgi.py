@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import asyncio
+from werkzeug.http import parse_cookie, parse_accept_header
+from werkzeug.datastructures import MIMEAccept
+
+# uvicorn --workers N = N process -> session ใน memory ไม่เห็นกัน ใช้ sqlite เป็น default
+# (ต้องตั้งก่อน config.py ถูก import ผ่าน app ด้านล่าง)
+os.environ.setdefault("CTF_SESSION_BACKEND", "sqlite")
+
+import metrics
+from app import create_app
+from config import SESSION_BACKEND, MASTER_SECRET, MASTER_SECRET_FILE
+from tokens import GATE_TOKENS
+from workers import CPU_POOL, Overloaded
+from stage2.otp import QR_CACHE, QR_MIMETYPES, otp_window, seconds_left_in_window
+
+try:
+    from asgiref.wsgi import WsgiToAsgi  # optional: pip install asgiref uvicorn
+except ImportError:
+    WsgiToAsgi = None
+
+# =========================================================
+# ASGI ENTRY POINT:  CTF_MASTER_SECRET=... uvicorn asgi:app --workers 4
+# ต้องตั้ง CTF_MASTER_SECRET หรือ CTF_MASTER_SECRET_FILE เสมอ: uvicorn spawn worker ใหม่ทุกตัว (ไม่ fork จาก master)
+# ถ้าไม่ตั้ง แต่ละ worker สุ่ม master secret ของตัวเอง -> token ที่ worker หนึ่งเซ็น worker อื่น verify ไม่ผ่าน
+# - route ที่ต้อง "รอ" (SSE /stage2/otp/stream, QR) เป็น coroutine บน event loop จริง
+#   client ที่เปิด stream ค้างไว้เป็นพัน ๆ ไม่กิน thread คนละตัว
+# - งาน CPU (render QR) ส่งไป CPU_POOL ผ่าน run_async -> loop ไม่ค้าง
+# - route อื่นทั้งหมด (stage1 / stage2 / stage3 / assets / ops) ส่งต่อให้ Flask app เดิมผ่าน WsgiToAsgi
+#   (handler พวกนั้นทำงานไม่กี่ ms ไม่มีอะไรให้รอ)
+# - route ที่ตอบเองนับเข้า /metrics ด้วยชื่อ endpoint เดียวกับ Flask
+# WSGI mode เดิม (python app.py / wsgi.py) ยังใช้ได้เหมือนเดิม
+# =========================================================
+SSE_HEARTBEAT_SECONDS = 15.0
+
+GATE_LOCKED = b"Stage 2 is locked. Unlock with Stage 1 password first."
+
+class AsyncWindowFeed:
+    """QR window events for coroutines: one shared future per window instead of one waiting thread per client."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._window = -1
+        self._event = b""
+        self._next = loop.create_future()
+        QR_CACHE.broadcaster.subscribe(self._on_publish)
+
+    def _on_publish(self, t: int, event: bytes):
+        # เรียกจาก thread pre-render -> ส่งเข้า loop
+        self._loop.call_soon_threadsafe(self._set, t, event)
+
+    def _set(self, t: int, event: bytes):
+        self._window, self._event = t, event
+        fut, self._next = self._next, self._loop.create_future()
+        fut.set_result(None)
+
+    async def wait_next(self, after: int, timeout: float):
+        """(window, event) once a window newer than `after` is published, or the current one on timeout."""
+        if self._window <= after:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._next), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._window, self._event
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+async def _send_simple(send, status: int, body: bytes, content_type: bytes = b"text/html; charset=utf-8",
+                       headers: list = ()):
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", content_type), (b"content-length", str(len(body)).encode("ascii")), *headers,
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+async def _wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+class CTFAsgiApp:
+    def __init__(self, flask_app):
+        if WsgiToAsgi is None:
+            raise RuntimeError("ASGI mode needs asgiref: pip install asgiref uvicorn")
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.routes = {  # path -> (Flask endpoint name สำหรับ metrics, handler)
+            "/stage2/otp/stream": ("stage2.otp_stream", self.otp_stream),
+            "/stage2/otp.png": ("stage2.otp_png", self.otp_png),
+        }
+        self._feed = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        route = self.routes.get(scope.get("path")) if scope["type"] == "http" and scope["method"] == "GET" else None
+        if route is None:
+            return await self.wsgi(scope, receive, send)
+        endpoint, handler = route
+        started = metrics.native_begin()
+
+        async def send_observed(message):
+            if message["type"] == "http.response.start":
+                metrics.native_response(endpoint, message["status"], started)
+            await send(message)
+
+        try:
+            await handler(scope, receive, send_observed)
+        except Overloaded as e:
+            body = b'{"ok":false,"error":"Server busy, retry later.","endpoint":"' + e.endpoint.encode() + b'"}'
+            await _send_simple(send_observed, 503, body, b"application/json",
+                               [(b"retry-after", str(e.retry_after).encode("ascii"))])
+        finally:
+            metrics.native_end()
+
+    def _gate(self, scope):
+        return GATE_TOKENS.verify(parse_cookie(_header(scope, b"cookie")).get("s2gate", ""))
+
+    def feed(self) -> AsyncWindowFeed:
+        if self._feed is None:
+            self._feed = AsyncWindowFeed(asyncio.get_running_loop())
+        return self._feed
+
+    async def otp_png(self, scope, receive, send):
+        if self._gate(scope) is None:
+            return await _send_simple(send, 401, GATE_LOCKED)
+        accept = parse_accept_header(_header(scope, b"accept"), MIMEAccept)
+        fmt = "svg" if accept.quality(QR_MIMETYPES["svg"]) > accept.quality(QR_MIMETYPES["png"]) else "png"
+
+        QR_CACHE.ensure_prerender()
+        now = time.time()
+        t = otp_window(now)
+        img = QR_CACHE.cached(t, fmt)
+        if img is None:
+            img = await CPU_POOL.run_async("stage2.otp_png", QR_CACHE.get, t, fmt)
+        await _send_simple(send, 200, img, QR_MIMETYPES[fmt].encode("ascii"), [
+            (b"vary", b"Accept"),
+            (b"cache-control", f"private, max-age={seconds_left_in_window(now)}".encode("ascii")),
+        ])
+
+    async def otp_stream(self, scope, receive, send):
+        verified = self._gate(scope)
+        if verified is None:
+            return await _send_simple(send, 401, GATE_LOCKED)
+        until = verified[0]
+
+        QR_CACHE.ensure_prerender()
+        feed = self.feed()
+        now = time.time()
+        last = otp_window(now)
+        first = await CPU_POOL.run_async("stage2.otp_stream", QR_CACHE.window_event, last, seconds_left_in_window(now))
+
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        await send({"type": "http.response.body", "body": first, "more_body": True})
+        disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            while time.time() < until and not disconnected.done():
+                timeout = min(SSE_HEARTBEAT_SECONDS, max(0.0, until - time.time()))
+                t, event = await feed.wait_next(last, timeout)
+                if t > last:
+                    last = t
+                    await send({"type": "http.response.body", "body": event, "more_body": True})
+                else:
+                    await send({"type": "http.response.body", "body": b": ping\n\n", "more_body": True})
+            if not disconnected.done():
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnected.cancel()
+
+def _worker_count() -> int:
+    """--workers N / --workers=N / -w N on the command line (worker ที่ spawn มาได้ argv ของ parent), else WEB_CONCURRENCY."""
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg in ("--workers", "-w") and i + 1 < len(args):
+            return int(args[i + 1])
+        if arg.startswith("--workers="):
+            return int(arg.split("=", 1)[1])
+    return int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+# เช็คทุกครั้ง ไม่ขึ้นกับจำนวน worker: server บางตัว (gunicorn -k uvicorn...) ไม่บอกผ่าน argv / env
+if not (MASTER_SECRET or MASTER_SECRET_FILE):
+    raise RuntimeError("ASGI mode needs CTF_MASTER_SECRET or CTF_MASTER_SECRET_FILE "
+                       "(every worker process must sign tokens with the same key)")
+if SESSION_BACKEND == "memory" and _worker_count() > 1:
+    raise RuntimeError("CTF_SESSION_BACKEND=memory cannot be shared by multiple ASGI workers; use sqlite")
+
+app = CTFAsgiApp(create_app(preload=True))
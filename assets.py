@@ -0,0 +1,160 @@
+import hashlib
+from dataclasses import dataclass
+from flask import Blueprint, Response, request, abort
+
+# =========================================================
+# UI THEME (Cyber / Terminal) - เพิ่มการตกแต่ง ไม่ยุ่งกับ logic
+# =========================================================
+THEME_CSS = """
+:root{
+  --bg0:#06080f; --bg1:#0b1221; --card:#0b1324cc;
+  --line:#00ffd533; --text:#d6ffe8; --muted:#89a7a0;
+  --neon:#00ffd5; --pink:#ff3dd8; --warn:#ffd500;
+}
+*{box-sizing:border-box}
+html,body{height:100%}
+body{
+  margin:0; color:var(--text);
+  font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Liberation Mono","Courier New", monospace;
+  background:
+    radial-gradient(1000px 600px at 20% 10%, #132a33 0%, transparent 60%),
+    radial-gradient(900px 500px at 80% 20%, #2b1244 0%, transparent 55%),
+    radial-gradient(900px 600px at 50% 90%, #0a2e1c 0%, transparent 55%),
+    linear-gradient(180deg, var(--bg0), var(--bg1));
+  overflow-x:hidden;
+}
+a{color:var(--neon); text-decoration:none}
+a:hover{filter:brightness(1.2)}
+.container{max-width:980px; margin:0 auto; padding:28px 16px 60px}
+.topbar{
+  display:flex; align-items:center; justify-content:space-between; gap:12px;
+  padding:14px 16px; border:1px solid var(--line);
+  background:linear-gradient(180deg, #0b1324cc, #070a12cc);
+  border-radius:16px; box-shadow:0 0 0 1px #00ffd511 inset, 0 0 30px #00ffd508;
+}
+.brand{display:flex; flex-direction:column; gap:4px}
+.brand b{letter-spacing:.8px}
+.badges{display:flex; gap:8px; flex-wrap:wrap; justify-content:flex-end}
+.badge{
+  font-size:12px; padding:6px 10px; border-radius:999px;
+  border:1px solid var(--line); background:#07101dcc;
+  color:var(--muted);
+}
+.badge.neon{color:var(--neon); border-color:#00ffd566}
+.badge.pink{color:var(--pink); border-color:#ff3dd866}
+.badge.warn{color:var(--warn); border-color:#ffd50066}
+.grid{display:grid; grid-template-columns:repeat(12,1fr); gap:14px; margin-top:16px}
+.card{
+  grid-column:span 12;
+  border:1px solid var(--line);
+  background:var(--card);
+  border-radius:16px;
+  padding:16px 16px;
+  box-shadow:0 0 0 1px #00ffd50c inset;
+}
+@media (min-width:840px){
+  .card.half{grid-column:span 6}
+}
+h1,h2,h3,h4{margin:0 0 10px}
+h1{font-size:22px}
+h2{font-size:18px; color:#bfffee}
+h3{font-size:16px; color:#bfffee}
+h4{font-size:14px; color:#bfffee; margin-top:14px}
+p{margin:8px 0; color:var(--text)}
+small, .muted{color:var(--muted)}
+hr{border:none; border-top:1px solid var(--line); margin:14px 0}
+pre{
+  white-space:pre-wrap; word-break:break-word;
+  background:#050a14; border:1px solid #00ffd522;
+  padding:12px; border-radius:12px; color:#d9fff0;
+  box-shadow:0 0 0 1px #00ffd50a inset;
+}
+.kbd{
+  display:inline-block; padding:2px 8px; border-radius:8px;
+  border:1px solid #00ffd522; background:#050a14; color:#bfffee;
+}
+.btn{
+  display:inline-flex; align-items:center; gap:8px;
+  padding:10px 12px; border-radius:12px;
+  border:1px solid #00ffd566; background:#04121a;
+  color:var(--neon); cursor:pointer;
+  box-shadow:0 0 0 1px #00ffd516 inset, 0 10px 24px #00ffd506;
+}
+.btn:hover{filter:brightness(1.15)}
+.btn.secondary{border-color:#ffffff22; color:#d6ffe8}
+.btn.pink{border-color:#ff3dd866; color:#ffb7f1; box-shadow:0 0 0 1px #ff3dd816 inset, 0 10px 24px #ff3dd806}
+.row{display:flex; gap:10px; flex-wrap:wrap; align-items:center}
+form{display:grid; gap:10px; margin-top:10px}
+input{
+  width:100%;
+  padding:10px 12px; border-radius:12px;
+  background:#050a14; border:1px solid #00ffd522; color:var(--text);
+}
+input:focus{outline:none; border-color:#00ffd588; box-shadow:0 0 0 3px #00ffd51a}
+.footer{
+  margin-top:16px; color:var(--muted); font-size:12px;
+  border-top:1px dashed #00ffd522; padding-top:12px;
+}
+details{border:1px dashed #00ffd533; border-radius:12px; padding:10px 12px; background:#050a14}
+summary{cursor:pointer; color:#bfffee}
+.scanline{
+  position:fixed; left:0; top:-40%;
+  width:100%; height:40%;
+  background:linear-gradient(180deg, transparent, #00ffd51a, transparent);
+  animation:scan 5.5s linear infinite;
+  pointer-events:none;
+}
+@keyframes scan {0%{top:-40%} 100%{top:120%}}
+"""
+
+THEME_JS = """
+function copyText(id){
+  const el = document.getElementById(id);
+  if(!el) return;
+  const text = el.innerText || el.textContent || "";
+  navigator.clipboard.writeText(text).then(()=>{
+    const b = document.getElementById(id+"-btn");
+    if(b){ b.innerText = "Copied ✓"; setTimeout(()=>b.innerText="Copy", 1100); }
+  });
+}
+"""
+
+# =========================================================
+# STATIC ASSET PIPELINE
+# theme.<hash>.css / theme.<hash>.js สร้างครั้งเดียวตอน start แล้วให้ browser cache ได้ตลอด
+# =========================================================
+@dataclass(frozen=True)
+class StaticAsset:
+    name: str
+    body: bytes
+    mimetype: str
+    etag: str
+
+def build_asset(stem: str, ext: str, text: str, mimetype: str) -> StaticAsset:
+    body = text.encode("utf-8")
+    digest = hashlib.sha256(body).hexdigest()
+    return StaticAsset(name=f"{stem}.{digest[:12]}.{ext}", body=body, mimetype=mimetype, etag=digest)
+
+THEME_CSS_ASSET = build_asset("theme", "css", THEME_CSS, "text/css; charset=utf-8")
+THEME_JS_ASSET = build_asset("theme", "js", THEME_JS, "application/javascript; charset=utf-8")
+
+ASSETS = {a.name: a for a in (THEME_CSS_ASSET, THEME_JS_ASSET)}
+
+def asset_url(asset: StaticAsset) -> str:
+    return f"/assets/{asset.name}"
+
+# =========================================================
+# ROUTES
+# =========================================================
+assets_bp = Blueprint("assets", __name__)
+
+@assets_bp.get("/assets/<name>")
+def serve_asset(name: str):
+    asset = ASSETS.get(name)
+    if asset is None:
+        abort(404)
+    resp = Response(asset.body, mimetype=asset.mimetype)
+    resp.set_etag(asset.etag)
+    # ชื่อไฟล์มี content hash อยู่แล้ว -> เนื้อหาไม่มีวันเปลี่ยน
+    resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp.make_conditional(request)
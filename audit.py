@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import mmap
+import time
+import atexit
+import hashlib
+import threading
+from collections import deque
+from flask import request, has_request_context
+
+from config import (
+    AUDIT_ENABLED, AUDIT_DIR, AUDIT_BUFFER_SIZE, AUDIT_SEGMENT_MAX_BYTES,
+    AUDIT_FLUSH_INTERVAL_SECONDS, AUDIT_FSYNC_INTERVAL_SECONDS,
+)
+
+# =========================================================
+# AUDIT LOG
+# - emit(): append tuple ลง deque (O(1), ไม่แตะ disk, ไม่ serialize) -> request ไม่ block
+# - writer thread ตื่นทุก AUDIT_FLUSH_INTERVAL_SECONDS: serialize เป็น JSONL แล้วเขียนทีเดียวทั้ง batch
+#   fsync ไม่บ่อยกว่า AUDIT_FSYNC_INTERVAL_SECONDS (และทุกครั้งที่ rotate / ปิดโปรแกรม)
+# - segment: audit-<start ms>-<pid>-<seq>.jsonl แยกต่อ process (หลาย worker ไม่เขียนไฟล์เดียวกัน)
+#   batch ถัดไปจะทำให้เกิน AUDIT_SEGMENT_MAX_BYTES -> เปิด segment ใหม่ก่อนเขียน
+# - อ่าน: read_events() / python audit.py [dir] [event prefix] (mmap ทีละ segment)
+# =========================================================
+class AuditLog:
+    def __init__(self, directory: str = AUDIT_DIR, buffer_size: int = AUDIT_BUFFER_SIZE,
+                 segment_max_bytes: int = AUDIT_SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self._buffer = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._file = None
+        self._size = 0
+        self._last_fsync = 0.0
+        self._dirty = False
+        self.written = 0
+        self.dropped = 0
+        self.segments = 0
+
+    # ----- request side -----
+    def emit(self, event: str, fields: dict):
+        if self._pid != os.getpid():
+            self._start()
+        buf = self._buffer
+        if len(buf) == buf.maxlen:
+            self.dropped += 1  # ไม่ล็อก: ตัวเลขโดยประมาณพอ
+        buf.append((time.time(), event, fields))
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # หลัง fork: ไฟล์/thread ของ parent ใช้ไม่ได้ -> เริ่มใหม่ใน process นี้
+            self._pid = os.getpid()
+            self._file = None
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    # ----- writer side -----
+    def _open_segment(self):
+        if self._file is not None:
+            self._fsync()
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self.segments += 1
+        name = f"audit-{int(time.time() * 1000)}-{os.getpid()}-{self.segments:04d}.jsonl"
+        self._file = open(os.path.join(self.directory, name), "ab")
+        self._size = 0
+
+    def _fsync(self):
+        if self._dirty:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+        self._last_fsync = time.monotonic()
+
+    def flush(self):
+        """Write everything buffered so far (writer thread, or atexit)."""
+        with self._lock:
+            buf = self._buffer
+            if not buf:
+                return
+            lines = []
+            while buf:
+                ts, event, fields = buf.popleft()
+                lines.append(json.dumps({"ts": round(ts, 3), "event": event, **fields},
+                                        ensure_ascii=False, separators=(",", ":")))
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            if self._file is None or self._size + len(data) > self.segment_max_bytes:
+                self._open_segment()
+            self._file.write(data)
+            self._size += len(data)
+            self._dirty = True
+            self.written += len(lines)
+            if time.monotonic() - self._last_fsync >= AUDIT_FSYNC_INTERVAL_SECONDS:
+                self._fsync()
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._fsync()
+                self._file.close()
+                self._file = None
+
+    def _run(self):
+        while True:
+            time.sleep(AUDIT_FLUSH_INTERVAL_SECONDS)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[audit] write failed: {e}", file=sys.stderr)
+
+    def stats(self) -> dict:
+        return {"enabled": AUDIT_ENABLED, "buffered": len(self._buffer), "written": self.written,
+                "dropped": self.dropped, "segments": self.segments}
+
+AUDIT_LOG = AuditLog()
+atexit.register(AUDIT_LOG.close)
+
+def player_id(gate_token: str) -> str:
+    """Short stable id for one s2gate token (ไม่เก็บ token ลง log)."""
+    return hashlib.blake2b(gate_token.encode("utf-8"), digest_size=6).hexdigest() if gate_token else ""
+
+def record(event: str, **fields):
+    """Audit event from a request handler; adds client ip and player id."""
+    if not AUDIT_ENABLED:
+        return
+    if has_request_context():
+        fields.setdefault("ip", request.remote_addr)
+        fields.setdefault("player", player_id(request.cookies.get("s2gate", "")))
+    AUDIT_LOG.emit(event, fields)
+
+# =========================================================
+# READER
+# =========================================================
+def segment_paths(directory: str = AUDIT_DIR) -> list:
+    """Segment files oldest first (ชื่อไฟล์ขึ้นต้นด้วยเวลาเปิด segment)."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, n) for n in sorted(names) if n.startswith("audit-") and n.endswith(".jsonl")]
+
+def read_events(directory: str = AUDIT_DIR, event_prefix: str = ""):
+    """Yield events from every segment via mmap; an unfinished last line is skipped."""
+    prefix = f'"event":"{event_prefix}'.encode("utf-8") if event_prefix else b""
+    for path in segment_paths(directory):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                start = 0
+                while True:
+                    end = mm.find(b"\n", start)
+                    if end < 0:
+                        break
+                    line = mm[start:end]
+                    start = end + 1
+                    if prefix and prefix not in line:
+                        continue  # กรองแบบ bytes ก่อน ไม่ต้อง parse ทุกบรรทัด
+                    event = json.loads(line)
+                    if event["event"].startswith(event_prefix):
+                        yield event
+
+if __name__ == "__main__":
+    # python audit.py [dir] [event prefix]
+    args = sys.argv[1:]
+    for ev in read_events(args[0] if args else AUDIT_DIR, args[1] if len(args) > 1 else ""):
+        print(json.dumps(ev, ensure_ascii=False))
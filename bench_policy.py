@@ -0,0 +1,65 @@
+import sys
+import time
+import random
+import timeit
+
+from policy import CompiledPolicy
+
+# Micro-benchmark: compiled policy (policy.py) vs. the old dict-walking checks, at scale
+# รัน: python bench_policy.py
+
+N = 200_000
+N_ROLES = 2_000
+N_PERMISSIONS = 2_000
+GRANT_RATE = 0.05
+LEVELS = {"PUBLIC": 0, "CONFIDENTIAL": 1, "SECRET": 2, "TOP_SECRET": 3}
+
+def synthetic_matrix(rng: random.Random) -> dict:
+    perms = [f"res{i}.action" for i in range(N_PERMISSIONS)]
+    return {f"role{r}": {p: rng.random() < GRANT_RATE for p in perms} for r in range(N_ROLES)}
+
+# ----- old style (utils.is_allowed / clearance_at_least ก่อนมี policy.py) -----
+def legacy_decide(matrix: dict, session: dict, permission: str, label: str) -> bool:
+    return (matrix.get(session.get("role"), {}).get(permission, False)
+            and LEVELS.get(session.get("clearance"), -1) >= LEVELS.get(label, 999))
+
+def main():
+    rng = random.Random(1)
+    matrix = synthetic_matrix(rng)
+
+    started = time.perf_counter()
+    policy = CompiledPolicy(matrix, list(matrix), LEVELS)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    # request ชุดเดียวกันทั้งสองแบบ (แบบ compiled resolve permission/label เป็นตัวเลขไว้ก่อน เหมือนใน route)
+    cases = []
+    for _ in range(1024):
+        session = {"role": f"role{rng.randrange(N_ROLES)}", "clearance": rng.choice(list(LEVELS))}
+        perm, label = f"res{rng.randrange(N_PERMISSIONS)}.action", rng.choice(list(LEVELS))
+        cases.append((session, perm, label, policy.permission_bit(perm), policy.label_level(label)))
+    for session, perm, label, bit, level in cases:
+        assert legacy_decide(matrix, session, perm, label) == policy.decide(session, bit, level)
+
+    def run_legacy():
+        for session, perm, label, _, _ in cases:
+            legacy_decide(matrix, session, perm, label)
+
+    def run_compiled():
+        decide = policy.decide
+        for session, _, _, bit, level in cases:
+            decide(session, bit, level)
+
+    loops = N // len(cases)
+    legacy = N / timeit.timeit(run_legacy, number=loops)
+    compiled = N / timeit.timeit(run_compiled, number=loops)
+    print(f"{N_ROLES} roles x {N_PERMISSIONS} permissions, compiled in {compile_ms:.0f} ms")
+    print(f"{'check':<12}{'ops/s':>14}")
+    print(f"{'legacy':<12}{legacy:>14,.0f}")
+    print(f"{'compiled':<12}{compiled:>14,.0f}{compiled / legacy:>9.2f}x")
+
+    legacy_bytes = sys.getsizeof(matrix) + sum(sys.getsizeof(g) for g in matrix.values())
+    compiled_bytes = sys.getsizeof(policy.masks) + sum(sys.getsizeof(m) for m in policy.masks.values())
+    print(f"matrix memory: legacy {legacy_bytes / 1e6:.1f} MB, compiled {compiled_bytes / 1e6:.2f} MB")
+
+if __name__ == "__main__":
+    main()
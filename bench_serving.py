@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+
+import assets
+
+# Throughput benchmark: dev server (python app.py) vs. gunicorn + wsgi.py (pre-fork, preload)
+# รัน: python bench_serving.py [--mode dev|gunicorn|both] [--seconds 10] [--concurrency 16]
+
+# asset ใช้ชื่อแบบ content hash -> ต้องขอ URL จริงจาก assets (path ตายตัวจะได้ 404)
+PATHS = ["/", "/stage1", "/stage1/handshake.json", "/stage2", assets.asset_url(assets.THEME_CSS_ASSET)]
+
+SERVERS = {
+    "dev": ([sys.executable, "app.py"], "127.0.0.1", 5001, {}),
+    "gunicorn": (["gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"], "127.0.0.1", 5002,
+                 {"CTF_BIND": "127.0.0.1:5002"}),
+}
+
+def wait_for_port(host: str, port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on {host}:{port} did not start")
+
+def client(host: str, port: int, stop_at: float, latencies: list, errors: list):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    i = 0
+    while time.perf_counter() < stop_at:
+        path = PATHS[i % len(PATHS)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path, headers={"Accept-Encoding": "gzip"})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status == 404 or resp.status >= 500:  # /stage2 ตอบ 401 (หน้าล็อก) เป็นปกติ
+                errors.append(path)
+            if resp.will_close:
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=10)
+        except (OSError, http.client.HTTPException):
+            errors.append(path)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+def run_load(host: str, port: int, seconds: float, concurrency: int) -> dict:
+    stop_at = time.perf_counter() + seconds
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client, args=(host, port, stop_at, latencies, errors))
+               for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    n = len(latencies) or 1
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / seconds,
+        "p50_ms": latencies[n // 2] * 1000 if latencies else 0.0,
+        "p99_ms": latencies[min(n - 1, int(n * 0.99))] * 1000 if latencies else 0.0,
+    }
+
+def bench(mode: str, seconds: float, concurrency: int):
+    cmd, host, port, env = SERVERS[mode]
+    if shutil.which(cmd[0]) is None:
+        print(f"{mode:<10} skipped ({cmd[0]} not installed)")
+        return None
+    proc = subprocess.Popen(cmd, env={**os.environ, **env}, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(host, port)
+        run_load(host, port, 1.0, concurrency)  # warm-up
+        return run_load(host, port, seconds, concurrency)
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)  # dev server มี reloader child -> kill ทั้ง group
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["dev", "gunicorn", "both"], default="both")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    modes = ["dev", "gunicorn"] if args.mode == "both" else [args.mode]
+    print(f"{'mode':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for mode in modes:
+        r = bench(mode, args.seconds, args.concurrency)
+        if r is not None:
+            print(f"{mode:<10}{r['rps']:>10,.0f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['errors']:>8}")
+
+if __name__ == "__main__":
+    main()
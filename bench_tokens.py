@@ -0,0 +1,70 @@
+import json
+import hmac
+import time
+import timeit
+import hashlib
+import secrets
+
+from utils import b64url_encode, b64url_decode
+from tokens import GATE_TOKENS, PROGRESS_TOKENS, encode_layers, decode_layers
+
+# Micro-benchmark: token codec (tokens.py) vs. the old JSON + hmac.new() tokens
+# รัน: python bench_tokens.py
+
+N = 50_000
+KEY = secrets.token_bytes(32)
+
+# ----- old style (json.dumps -> b64url -> hmac.new ทุกครั้ง) -----
+def legacy_sign(layers: list) -> str:
+    payload = {"layers": layers, "exp": int(time.time()) + 600}
+    body = b64url_encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    sig = hmac.new(KEY, body.encode("utf-8"), hashlib.sha256).digest()
+    return f"{body}.{b64url_encode(sig)}"
+
+def legacy_verify(token: str) -> list:
+    try:
+        body, sig = token.split(".", 1)
+        expected = hmac.new(KEY, body.encode("utf-8"), hashlib.sha256).digest()
+        if not hmac.compare_digest(b64url_decode(sig), expected):
+            return []
+        payload = json.loads(b64url_decode(body).decode("utf-8"))
+        if int(payload.get("exp", 0)) < int(time.time()):
+            return []
+        return payload.get("layers", [])
+    except Exception:
+        return []
+
+# ----- codec -----
+def codec_sign(layers: list) -> str:
+    return PROGRESS_TOKENS.sign(int(time.time()) + 600, encode_layers(layers))
+
+def codec_verify(token: str) -> list:
+    verified = PROGRESS_TOKENS.verify(token)
+    return decode_layers(verified[1]) if verified else []
+
+def codec_verify_cold(token: str) -> list:
+    PROGRESS_TOKENS.cache._entries.clear()  # บังคับ miss -> วัด HMAC path จริง
+    return codec_verify(token)
+
+def rate(fn, *args) -> float:
+    return N / timeit.timeit(lambda: fn(*args), number=N)
+
+def main():
+    layers = [1, 2, 3]
+    old_tok, new_tok = legacy_sign(layers), codec_sign(layers)
+    assert legacy_verify(old_tok) == codec_verify(new_tok) == layers
+    expired = GATE_TOKENS.sign(int(time.time()) - 1)
+
+    rows = [
+        ("sign", rate(legacy_sign, layers), rate(codec_sign, layers)),
+        ("verify (cold)", rate(legacy_verify, old_tok), rate(codec_verify_cold, new_tok)),
+        ("verify (cached)", rate(legacy_verify, old_tok), rate(codec_verify, new_tok)),
+    ]
+    print(f"{'op':<18}{'legacy ops/s':>14}{'codec ops/s':>14}{'speedup':>10}")
+    for name, old, new in rows:
+        print(f"{name:<18}{old:>14,.0f}{new:>14,.0f}{new / old:>9.2f}x")
+    print(f"{'verify expired':<18}{'':>14}{rate(GATE_TOKENS.verify, expired):>14,.0f}")
+    print(f"token size: legacy {len(old_tok)} chars, codec {len(new_tok)} chars")
+
+if __name__ == "__main__":
+    main()
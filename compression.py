@@ -0,0 +1,139 @@
+import gzip
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import request
+
+from config import COMPRESS_MIN_SIZE, COMPRESS_CACHE_MAX_ENTRIES
+from assets import ASSETS
+
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# =========================================================
+# RESPONSE COMPRESSION (gzip / br)
+# - GET 200 ที่ไม่มี Set-Cookie และมี strong ETag หรือ Cache-Control: immutable -> เนื้อหาคงที่
+#   เก็บ variant ที่บีบแล้ว (key = ETag หรือ content hash)
+# - อย่างอื่น (POST / error page / มี cookie / หน้าที่เปลี่ยนทุกครั้ง เช่น /metrics, /ops/*): บีบสด
+#   ไม่งั้น body ใหม่ทุก scrape จะไล่ asset ที่บีบไว้ออกจาก cache
+# - เล็กกว่า COMPRESS_MIN_SIZE ไม่บีบ
+# - streamed response: บีบแบบ streaming ทีละ chunk
+# =========================================================
+COMPRESSIBLE_MIMETYPES = {
+    "text/html", "text/css", "text/plain", "text/event-stream",
+    "application/javascript", "application/json", "image/svg+xml",
+}
+
+# ระดับการบีบ: variant ที่ cache ไว้บีบครั้งเดียว -> ใช้ระดับสูงสุดได้
+CACHED_LEVEL = {"br": 11, "gzip": 9}
+DYNAMIC_LEVEL = {"br": 5, "gzip": 6}
+
+_VARIANTS = OrderedDict()  # {(content_key, encoding): compressed bytes}
+_VARIANTS_LOCK = threading.Lock()
+
+def supported_encodings() -> tuple:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def negotiate_encoding(accept_encodings) -> str:
+    """Pick the best encoding the client accepts, or "" for identity."""
+    best, best_q = "", 0.0
+    for enc in supported_encodings():
+        q = accept_encodings.quality(enc)
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def content_key(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def cached_variant(key: str, data: bytes, encoding: str) -> bytes:
+    """Compressed variant of data, compressed at most once per (key, encoding)."""
+    cache_key = (key, encoding)
+    with _VARIANTS_LOCK:
+        hit = _VARIANTS.get(cache_key)
+        if hit is not None:
+            _VARIANTS.move_to_end(cache_key)
+            return hit
+    out = compress(data, encoding, CACHED_LEVEL[encoding])
+    with _VARIANTS_LOCK:
+        _VARIANTS[cache_key] = out
+        while len(_VARIANTS) > COMPRESS_CACHE_MAX_ENTRIES:
+            _VARIANTS.popitem(last=False)
+    return out
+
+def warm(key: str, data: bytes):
+    """Precompress data for every supported encoding (used at startup for static assets)."""
+    for enc in supported_encodings():
+        cached_variant(key, data, enc)
+
+def _stream_compress(chunks, encoding: str):
+    if encoding == "br":
+        comp = brotli.Compressor(quality=DYNAMIC_LEVEL["br"])
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            out = comp.process(chunk) + comp.flush()
+            if out:
+                yield out
+        yield comp.finish()
+        return
+    comp = zlib.compressobj(DYNAMIC_LEVEL["gzip"], zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        # Z_SYNC_FLUSH: ให้ client ได้แต่ละ chunk ทันที (สำคัญกับ event stream)
+        out = comp.compress(chunk) + comp.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield comp.flush()
+
+def cacheable(resp, etag, weak) -> bool:
+    """Only fixed representations go in the variant cache."""
+    if request.method != "GET" or resp.status_code != 200 or "Set-Cookie" in resp.headers:
+        return False
+    return (etag is not None and not weak) or resp.cache_control.immutable
+
+def compress_response(resp):
+    """after_request hook."""
+    if resp.status_code < 200 or resp.status_code in (204, 206, 304) or "Content-Encoding" in resp.headers:
+        return resp
+    if resp.mimetype not in COMPRESSIBLE_MIMETYPES or resp.direct_passthrough:
+        return resp
+
+    encoding = negotiate_encoding(request.accept_encodings)
+    resp.vary.add("Accept-Encoding")
+    if not encoding:
+        return resp
+
+    if resp.is_streamed:
+        resp.response = _stream_compress(resp.response, encoding)
+        resp.headers.pop("Content-Length", None)
+    else:
+        data = resp.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return resp
+        etag, weak = resp.get_etag()
+        if cacheable(resp, etag, weak):
+            out = cached_variant(etag or content_key(data), data, encoding)
+        else:
+            out = compress(data, encoding, DYNAMIC_LEVEL[encoding])
+        resp.set_data(out)
+        if etag:
+            # representation ต่างจากต้นฉบับ -> ใช้ weak ETag (If-None-Match ยังเทียบแบบ weak ได้)
+            resp.set_etag(etag, weak=True)
+
+    resp.headers["Content-Encoding"] = encoding
+    return resp
+
+def init_app(app):
+    for asset in ASSETS.values():
+        warm(asset.etag, asset.body)
+    app.after_request(compress_response)
@@ -1,5 +1,5 @@
 
-import secrets
+import os
 
 # =========================================================
 # CTF CONFIG
@@ -11,10 +11,24 @@ STAGE2_PASSWORD_PLAINTEXT = "SUT_Gate_Open"
 
 # ✅ Stage 2 Gate: ต้องถอด Stage1 แล้วเอา pass มา unlock ก่อนถึงเห็น Stage2
 STAGE2_GATE_TTL_SECONDS = 10 * 60
-STAGE2_GATE_KEY = secrets.token_bytes(32)
 
 # Stage 2 OTP
 OTP_WINDOW_SECONDS = 30
+STAGE2_OTP_SEED = "server-room-sut-2026"
+
+# OTP QR output (ดู stage2/otp.py)
+OTP_QR_BOX_SIZE = 10          # pixel ต่อ module
+OTP_QR_BORDER = 4             # quiet zone (module)
+OTP_QR_PNG_ZLIB_LEVEL = 9     # PNG 1-bit: บีบสุดก็ยังเร็ว (ภาพเล็ก)
+OTP_QR_PNG_BACKEND = "compact"  # "compact" = PNG 1-bit ไม่ใช้ PIL, "pil" = qrcode + PIL แบบเดิม
+
+# OTP SSE (/stage2/otp/stream): WSGI ถือ thread 1 ตัวต่อ connection -> ส่งไม่เกินกี่ window แล้วปิด
+# EventSource ต่อใหม่เองพร้อม Last-Event-ID (= window ล่าสุดที่ได้) แล้ว stream ต่อจากตรงนั้น
+OTP_STREAM_MAX_WINDOWS = 2
+OTP_STREAM_RETRY_MS = 2000    # บอก EventSource ว่ารอเท่านี้ก่อนต่อใหม่
+# CTF_OTP_STREAM=0: route ตอบ 204 -> EventSource เลิกต่อ หน้า Layer 4 poll /stage2/otp.png?w= แทน
+# (gunicorn.conf.py ตั้งให้เอง: gthread มี thread น้อย ไม่ควรให้ stream ถือไว้; asgi.py stream เองบน event loop)
+OTP_STREAM_ENABLED = os.environ.get("CTF_OTP_STREAM", "1") == "1"
 
 # =========================================================
 # STAGE 2 MULTI-LAYER MFA CONFIG
@@ -40,9 +54,6 @@ STAGE2_KEYSTROKE_TARGET_PHRASE = "SUT-CYBER-LAB-2026"
 STAGE2_KEYSTROKE_MIN_TIME_MS = 500   # Too fast = bot
 STAGE2_KEYSTROKE_MAX_TIME_MS = 10000 # Too slow = copy-paste/afk
 
-# Progress tracking key
-STAGE2_PROGRESS_KEY = secrets.token_bytes(32)
-
 # Stage 3: MLS levels
 MLS_LEVEL = {"PUBLIC": 0, "CONFIDENTIAL": 1, "SECRET": 2}
 
@@ -68,9 +79,6 @@ ACCESS_MATRIX = {
     },
 }
 
-# คีย์เซ็น permit (Stage 3)
-PERMIT_SIGNING_KEY = secrets.token_bytes(32)
-
 # จำลอง user DB
 # NOTE: ตั้ง fame เป็น SECRET เพื่อให้ Stage 3 ขอ permit แล้วไปอ่าน flag ได้ (flow ไม่ตัน)
 USERS = {
@@ -78,5 +86,92 @@ USERS = {
     "admin": {"password": None, "role": "admin", "dept": "ITSEC", "clearance": "SECRET"},
 }
 
-# session store (in-memory)
-SESSIONS = {}
+# =========================================================
+# SESSIONS (ดู sessions.py)
+# =========================================================
+SESSION_TTL_SECONDS = 12 * 60 * 60   # อายุสูงสุดนับจาก login (field "ts")
+SESSION_IDLE_SECONDS = 2 * 60 * 60   # ไม่ได้ใช้เกินนี้ -> หมดอายุ
+SESSION_MAX = 10_000                 # เกินนี้ -> evict ตัวที่ไม่ได้ใช้นานสุด (LRU)
+
+# "memory" = dict ใน process (worker เดียว), "sqlite" = ไฟล์ WAL ที่ทุก worker บนเครื่องเดียวกันใช้ร่วมกัน
+SESSION_BACKEND = os.environ.get("CTF_SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.environ.get("CTF_SESSION_DB", "sessions.db")
+SESSION_SWEEP_INTERVAL_SECONDS = 30  # sqlite: ลบ session หมดอายุเป็น batch ทุกกี่วินาที
+SESSION_READ_CACHE_SECONDS = 2       # sqlite: cache อ่านต่อ worker (read-through)
+
+# =========================================================
+# RESPONSE COMPRESSION
+# =========================================================
+COMPRESS_MIN_SIZE = 512             # bytes: เล็กกว่านี้ไม่คุ้มบีบ
+COMPRESS_CACHE_MAX_ENTRIES = 256    # จำนวน variant (content x encoding) ที่เก็บไว้
+
+# =========================================================
+# KEY MANAGEMENT (ดู keys.py)
+# key เซ็น s2gate / s2progress / permit derive ด้วย HKDF จาก master secret ตัวเดียว
+# ทุก worker / ทุกเครื่องต้องใช้ master secret เดียวกัน token ถึงจะ verify ข้ามกันได้
+# ถ้าไม่ตั้ง -> สุ่มใหม่ตอน start (ใช้ได้แค่ process เดียว หรือ gunicorn --preload)
+# ASGI (asgi.py) ต้องตั้งเสมอ: uvicorn spawn worker แยก process ไม่ได้ fork จาก master
+# =========================================================
+MASTER_SECRET = os.environ.get("CTF_MASTER_SECRET", "")
+MASTER_SECRET_FILE = os.environ.get("CTF_MASTER_SECRET_FILE", "")
+KEY_ROTATION_SECONDS = 24 * 60 * 60  # เปลี่ยน key (kid ใหม่) ทุกกี่วินาที
+KEY_ACCEPT_PREVIOUS = 1              # ยัง verify token ที่เซ็นด้วย key รุ่นก่อนได้กี่รุ่น (overlap)
+TOKEN_CACHE_MAX_ENTRIES = 4096       # token ที่ verify แล้วเก็บไว้ต่อ token type (หมดอายุตาม exp)
+
+# =========================================================
+# CPU WORKER POOL (ดู workers.py) - งานหนัก (render QR ฯลฯ) ไม่รันบน request thread ตรง ๆ
+# =========================================================
+CPU_POOL_SIZE = int(os.environ.get("CTF_CPU_POOL_SIZE", "2"))
+CPU_POOL_MAX_QUEUE = int(os.environ.get("CTF_CPU_POOL_MAX_QUEUE", "16"))  # เกินนี้ -> 503 + Retry-After
+CPU_POOL_TIMEOUT_SECONDS = 10
+
+# =========================================================
+# STAGE 1 RSA KEY (ดู stage1/routes.py)
+# ไม่มี route ไหนใช้ key ทุก request -> ไม่ generate ตอน import แล้ว
+# - ตั้ง CTF_RSA_KEY_FILE: มีไฟล์ -> load PEM, ยังไม่มี -> generate ครั้งแรกแล้วเขียนเก็บ (restart ครั้งถัดไป load เลย)
+# - ไม่ตั้ง: generate ตอนใช้ครั้งแรก (เก็บใน memory)
+# - CTF_RSA_PRELOAD=1: load/generate ตอน start (ก่อน fork -> worker ใช้ key เดียวกันแบบ copy-on-write)
+# =========================================================
+RSA_KEY_FILE = os.environ.get("CTF_RSA_KEY_FILE", "")
+RSA_KEY_SIZE = 2048
+RSA_PRELOAD = os.environ.get("CTF_RSA_PRELOAD", "") == "1"
+
+# =========================================================
+# SERVING (ดู wsgi.py / gunicorn.conf.py)
+# CTF_PRELOAD=1: create_app() build หน้า / key / RSA ให้เสร็จก่อน (ใช้กับ pre-fork server)
+# =========================================================
+PRELOAD = os.environ.get("CTF_PRELOAD", "") == "1"
+
+# =========================================================
+# TRACING (ดู tracing.py) - ปิดเป็นค่า default: decorator คืน function เดิม ไม่มี overhead
+# =========================================================
+TRACE_ENABLED = os.environ.get("CTF_TRACE", "") == "1"
+TRACE_SAMPLE_RATE = float(os.environ.get("CTF_TRACE_SAMPLE", "0.01"))  # สัดส่วน request ที่เก็บ trace
+TRACE_SPANS_PER_REQUEST = 256   # ring buffer ต่อ request (span เกินนี้ทับตัวเก่า)
+TRACE_KEEP = 64                 # trace ล่าสุดที่เก็บไว้ให้ export
+
+# =========================================================
+# SAMPLING PROFILER (ดู profiler.py): GET /debug/profile?seconds=N
+# ไม่ตั้ง CTF_DEBUG_TOKEN -> endpoint ปิด (404); ต้องส่ง header X-Debug-Token ให้ตรง
+# =========================================================
+DEBUG_TOKEN = os.environ.get("CTF_DEBUG_TOKEN", "")
+PROFILE_MAX_SECONDS = 30
+PROFILE_INTERVAL_SECONDS = 0.005  # ~200 samples/s
+
+# =========================================================
+# OPS ENDPOINTS (/ops/*, /metrics, /debug/traces): ข้อมูลสดของงาน (ความคืบหน้าผู้เล่น, breaker) ห้ามให้ผู้เล่นเห็น
+# ต้องส่ง header X-Ops-Token หรือ Authorization: Bearer <token>
+# ไม่ตั้ง CTF_OPS_TOKEN -> ใช้ CTF_DEBUG_TOKEN แทน; ไม่ตั้งทั้งคู่ -> endpoint ปิด (404)
+# =========================================================
+OPS_TOKEN = os.environ.get("CTF_OPS_TOKEN", "") or DEBUG_TOKEN
+
+# =========================================================
+# AUDIT LOG (ดู audit.py) - event ด้านความปลอดภัย (unlock / PIN / biometric / location / OTP / permit)
+# request แค่ใส่ event ลง ring buffer; thread เบื้องหลังเขียนไฟล์ JSONL (แยกไฟล์ต่อ process)
+# =========================================================
+AUDIT_ENABLED = os.environ.get("CTF_AUDIT", "1") == "1"
+AUDIT_DIR = os.environ.get("CTF_AUDIT_DIR", "audit_log")
+AUDIT_BUFFER_SIZE = 65_536             # event ค้างใน memory ได้เท่านี้ (เต็ม -> ทิ้งตัวเก่าสุด + นับ dropped)
+AUDIT_SEGMENT_MAX_BYTES = 16 * 1024 * 1024  # segment ใหญ่เกินนี้ -> เปิดไฟล์ใหม่
+AUDIT_FLUSH_INTERVAL_SECONDS = 0.25    # writer ตื่นมาเขียน batch ทุกกี่วินาที
+AUDIT_FSYNC_INTERVAL_SECONDS = 2.0     # fsync อย่างมากครั้งละเท่านี้ (batch) + ตอน rotate
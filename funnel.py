@@ -0,0 +1,78 @@
+import json
+import time
+import threading
+
+# =========================================================
+# MFA FUNNEL (GET /ops/funnel)
+# นับ attempt / failure / completion ต่อขั้น + อัตราต่อวินาทีย้อนหลัง (rolling window)
+# - hit(): O(1) บวกตัวนับ + bucket ของวินาทีปัจจุบัน (ring ขนาด WINDOW_SECONDS)
+# - snapshot_json(): build ไม่เกินวินาทีละครั้ง แล้วคืน bytes เดิม -> dashboard poll ทุกวินาทีได้สบาย
+# ตัวเลขเป็นของ process นี้ (หลาย worker = แต่ละตัวนับของตัวเอง)
+# =========================================================
+STEPS = (
+    "stage1.unlock",    # ถอด Stage 1 ได้ -> unlock Stage 2
+    "stage2.pin",
+    "stage2.bio",
+    "stage2.location",
+    "stage2.otp",
+    "stage3.permit",
+    "stage3.flag",
+)
+WINDOW_SECONDS = 60
+RATE_WINDOWS = (10, 60)
+
+class Funnel:
+    def __init__(self, steps: tuple = STEPS, window: int = WINDOW_SECONDS, clock=time.time):
+        self.steps = steps
+        self.window = window
+        self._clock = clock
+        self._index = {step: i for i, step in enumerate(steps)}
+        self._ok = [0] * len(steps)
+        self._fail = [0] * len(steps)
+        # ring ต่อขั้น: [second stamp, ok, fail] ต่อช่อง (ช่อง = วินาที % window)
+        self._ring = [[[0, 0, 0] for _ in range(window)] for _ in steps]
+        self._lock = threading.Lock()
+        self._cached_at = -1
+        self._cached = b""
+
+    def hit(self, step: str, ok: bool):
+        i = self._index[step]
+        now = int(self._clock())
+        with self._lock:
+            bucket = self._ring[i][now % self.window]
+            if bucket[0] != now:
+                bucket[0], bucket[1], bucket[2] = now, 0, 0
+            if ok:
+                self._ok[i] += 1
+                bucket[1] += 1
+            else:
+                self._fail[i] += 1
+                bucket[2] += 1
+
+    def snapshot(self) -> dict:
+        now = int(self._clock())
+        steps = {}
+        with self._lock:
+            for step, i in self._index.items():
+                ok, fail = self._ok[i], self._fail[i]
+                rates = {}
+                for span in RATE_WINDOWS:
+                    r_ok = r_fail = 0
+                    for stamp, b_ok, b_fail in self._ring[i]:
+                        if now - span < stamp <= now:
+                            r_ok += b_ok
+                            r_fail += b_fail
+                    rates[f"{span}s"] = {"attempts_per_s": round((r_ok + r_fail) / span, 3),
+                                         "completions_per_s": round(r_ok / span, 3)}
+                steps[step] = {"attempts": ok + fail, "failures": fail, "completions": ok, "rate": rates}
+        return {"ts": now, "steps": steps}
+
+    def snapshot_json(self) -> bytes:
+        """Compact JSON snapshot, rebuilt at most once per second."""
+        now = int(self._clock())
+        if now != self._cached_at:
+            self._cached = json.dumps(self.snapshot(), separators=(",", ":")).encode("utf-8")
+            self._cached_at = now
+        return self._cached
+
+FUNNEL = Funnel()
@@ -0,0 +1,31 @@
+import os
+import multiprocessing
+
+# =========================================================
+# GUNICORN CONFIG:  gunicorn -c gunicorn.conf.py wsgi:app
+# ปรับได้ด้วย env: CTF_BIND, CTF_WORKERS, CTF_THREADS, CTF_KEEPALIVE, CTF_TIMEOUT
+# =========================================================
+bind = os.environ.get("CTF_BIND", "0.0.0.0:5001")
+workers = int(os.environ.get("CTF_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("CTF_THREADS", "4"))       # > 1 -> gthread worker
+worker_class = "gthread"
+keepalive = int(os.environ.get("CTF_KEEPALIVE", "5"))    # วินาที
+timeout = int(os.environ.get("CTF_TIMEOUT", "30"))
+
+# import wsgi:app ใน master ก่อน fork -> หน้า / key / master secret เหมือนกันทุก worker
+preload_app = True
+
+# หลาย worker = หลาย process -> session ใน memory ไม่เห็นกัน ใช้ sqlite เป็น default
+# (ต้องตั้งก่อน config.py ถูก import ซึ่งเกิดตอน preload ด้านล่างนี้)
+if workers > 1:
+    os.environ.setdefault("CTF_SESSION_BACKEND", "sqlite")
+
+# gthread: 1 connection ที่เปิดค้าง = 1 thread (ทั้ง server มีแค่ workers x threads ตัว)
+# SSE /stage2/otp/stream ของผู้เล่น Layer 4 ทุกคนจะกิน thread จนทุก route ค้าง -> ปิด stream ใน WSGI mode
+# หน้า Layer 4 จะ poll /stage2/otp.png?w= ตามรอบ window แทน
+# อยากได้ push จริง: ใช้ ASGI (uvicorn asgi:app) ซึ่ง stream บน event loop ไม่ถือ thread
+os.environ.setdefault("CTF_OTP_STREAM", "0")
+
+def when_ready(server):
+    import startup
+    startup.report()
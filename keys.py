@@ -0,0 +1,73 @@
+import time
+import secrets
+import threading
+from typing import Optional, Tuple
+
+from config import MASTER_SECRET, MASTER_SECRET_FILE, KEY_ROTATION_SECONDS, KEY_ACCEPT_PREVIOUS
+
+# =========================================================
+# KEY MANAGEMENT
+# key ของแต่ละ purpose = HKDF(master, info="<purpose>|<epoch>")
+# epoch = time // KEY_ROTATION_SECONDS และใช้เป็น key id (kid) ที่ฝังใน token
+# =========================================================
+_HKDF_SALT = b"sut-ctf-keyring-v1"
+
+def load_master_secret() -> bytes:
+    if MASTER_SECRET_FILE:
+        with open(MASTER_SECRET_FILE, "rb") as f:
+            return f.read().strip()
+    if MASTER_SECRET:
+        return MASTER_SECRET.encode("utf-8")
+    return secrets.token_bytes(32)
+
+MASTER_KEY = load_master_secret()
+
+def derive_key(purpose: str, epoch: int, master: bytes = MASTER_KEY) -> bytes:
+    # lazy import: cryptography โหลดตอน derive ครั้งแรก (ครั้งละ epoch ต่อ purpose)
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=_HKDF_SALT,
+                info=f"{purpose}|{epoch}".encode("utf-8"))
+    return hkdf.derive(master)
+
+class KeyRing:
+    """Signing keys for one purpose, rotated every KEY_ROTATION_SECONDS."""
+
+    def __init__(self, purpose: str, rotation: int = KEY_ROTATION_SECONDS,
+                 accept_previous: int = KEY_ACCEPT_PREVIOUS, clock=time.time):
+        self.purpose = purpose
+        self.rotation = rotation
+        self.accept_previous = accept_previous
+        self._clock = clock
+        self._keys = {}  # {epoch: key}
+        self._lock = threading.Lock()
+
+    def _epoch(self) -> int:
+        return int(self._clock() // self.rotation)
+
+    def _key(self, epoch: int) -> bytes:
+        key = self._keys.get(epoch)
+        if key is None:
+            key = derive_key(self.purpose, epoch)
+            with self._lock:
+                self._keys[epoch] = key
+                # เก็บไว้แค่รุ่นที่ยัง verify ได้
+                for old in [e for e in self._keys if e < epoch - self.accept_previous]:
+                    del self._keys[old]
+        return key
+
+    def current(self) -> Tuple[int, bytes]:
+        """(kid, key) to sign new tokens with."""
+        epoch = self._epoch()
+        return epoch, self._key(epoch)
+
+    def lookup(self, kid: int) -> Optional[bytes]:
+        """Key for kid if it is still inside the accept window, else None."""
+        epoch = self._epoch()
+        if not (epoch - self.accept_previous <= kid <= epoch):
+            return None
+        return self._key(kid)
+
+GATE_KEYS = KeyRing("stage2-gate")
+PROGRESS_KEYS = KeyRing("stage2-progress")
+PERMIT_KEYS = KeyRing("stage3-permit")
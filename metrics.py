@@ -0,0 +1,163 @@
+import time
+import bisect
+import weakref
+import threading
+from flask import request
+
+# =========================================================
+# METRICS (GET /metrics, Prometheus text format)
+# - latency histogram + status counter ต่อ endpoint, in-flight gauge
+# - เก็บแยกต่อ thread (shard) -> hot path ไม่ต้องล็อก แค่บวกเลขใน dict/list ของ thread ตัวเอง
+#   ตอน scrape ค่อยรวมทุก shard (ล็อกแค่ตอนสร้าง shard ใหม่ / ตอนรวม)
+#   thread จบ -> finalizer รวม shard เข้า _retired แล้วทิ้ง (ไม่สะสม shard ตามจำนวน thread ที่เคยมี)
+# =========================================================
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class _Shard:
+    __slots__ = ("latency", "sums", "status", "in_flight", "started")
+
+    def __init__(self):
+        self.latency = {}   # {endpoint: [count ต่อ bucket ... , +Inf]}
+        self.sums = {}      # {endpoint: seconds รวม}
+        self.status = {}    # {(endpoint, status code): count}
+        self.in_flight = 0  # +1 ตอนเริ่ม, -1 ตอน teardown (thread เดียวกัน)
+        self.started = None  # perf_counter ของ request ที่ thread นี้กำลังทำ (1 thread = 1 request ต่อครั้ง)
+
+_local = threading.local()
+_shards = set()
+_retired = _Shard()  # รวมยอดของ thread ที่จบไปแล้ว (dev server สร้าง thread ใหม่ทุก connection)
+_shards_lock = threading.Lock()
+
+class _ThreadEnd:
+    """Lives in the thread-local: dropped when its thread exits, which fires the finalizer."""
+    __slots__ = ("__weakref__",)
+
+def _merge(into: _Shard, shard: _Shard):
+    for endpoint, counts in list(shard.latency.items()):
+        merged = into.latency.setdefault(endpoint, [0] * len(counts))
+        for i, n in enumerate(counts):
+            merged[i] += n
+    for endpoint, total in list(shard.sums.items()):
+        into.sums[endpoint] = into.sums.get(endpoint, 0.0) + total
+    for key, n in list(shard.status.items()):
+        into.status[key] = into.status.get(key, 0) + n
+    into.in_flight += shard.in_flight
+
+def _retire(shard: _Shard):
+    with _shards_lock:
+        if shard in _shards:
+            _shards.discard(shard)
+            _merge(_retired, shard)
+
+def _shard() -> _Shard:
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = _Shard()
+        end = _local.end = _ThreadEnd()
+        weakref.finalize(end, _retire, shard)
+        with _shards_lock:
+            _shards.add(shard)
+        return shard
+
+# NOTE: เข้าถึง flask.request ผ่าน proxy ช้า (~µs ต่อครั้ง) -> เก็บเวลาเริ่มไว้ใน shard แทน environ
+# และดึง request object จริงครั้งเดียว
+def _before_request():
+    shard = _shard()
+    shard.in_flight += 1
+    shard.started = time.perf_counter()
+
+def _after_request(resp):
+    shard = _shard()
+    started = shard.started
+    if started is None:
+        return resp
+    elapsed = time.perf_counter() - started
+    endpoint = request._get_current_object().endpoint or "unmatched"
+    observe(shard, endpoint, resp.status_code, elapsed)
+    return resp
+
+def observe(shard: _Shard, endpoint: str, status: int, elapsed: float):
+    counts = shard.latency.get(endpoint)
+    if counts is None:
+        counts = shard.latency[endpoint] = [0] * (len(LATENCY_BUCKETS) + 1)
+        shard.sums[endpoint] = 0.0
+    counts[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+    shard.sums[endpoint] += elapsed
+    key = (endpoint, status)
+    shard.status[key] = shard.status.get(key, 0) + 1
+
+def _teardown_request(_exc):
+    shard = _shard()
+    if shard.started is not None:
+        shard.started = None
+        shard.in_flight -= 1
+
+# ----- route ที่ไม่ผ่าน Flask (asgi.py ตอบเองบน event loop) -----
+def native_begin() -> float:
+    _shard().in_flight += 1
+    return time.perf_counter()
+
+def native_response(endpoint: str, status: int, started: float):
+    """Count a natively served response when its headers go out (same point Flask's after_request sees)."""
+    observe(_shard(), endpoint, status, time.perf_counter() - started)
+
+def native_end():
+    _shard().in_flight -= 1
+
+def snapshot() -> dict:
+    """Merge every live thread's shard plus retired threads: {"latency", "sums", "status", "in_flight"}."""
+    total = _Shard()
+    with _shards_lock:
+        _merge(total, _retired)
+        shards = list(_shards)
+    for shard in shards:
+        _merge(total, shard)
+    return {"latency": total.latency, "sums": total.sums, "status": total.status, "in_flight": total.in_flight}
+
+# ===== text exposition =====
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+def sample(name: str, value, labels: dict = None) -> str:
+    return f"{name}{_labels(labels)} {value}"
+
+def render_http() -> list:
+    """Exposition lines for the request metrics."""
+    snap = snapshot()
+    lines = [
+        "# HELP ctf_http_request_duration_seconds Request latency by endpoint.",
+        "# TYPE ctf_http_request_duration_seconds histogram",
+    ]
+    for endpoint in sorted(snap["latency"]):
+        cumulative = 0
+        for le, n in zip((*LATENCY_BUCKETS, "+Inf"), snap["latency"][endpoint]):
+            cumulative += n
+            lines.append(sample("ctf_http_request_duration_seconds_bucket", cumulative,
+                                {"endpoint": endpoint, "le": le}))
+        lines.append(sample("ctf_http_request_duration_seconds_sum", round(snap["sums"][endpoint], 6),
+                            {"endpoint": endpoint}))
+        lines.append(sample("ctf_http_request_duration_seconds_count", cumulative, {"endpoint": endpoint}))
+    lines += [
+        "# HELP ctf_http_responses_total Responses by endpoint and status code.",
+        "# TYPE ctf_http_responses_total counter",
+    ]
+    for (endpoint, code), n in sorted(snap["status"].items()):
+        lines.append(sample("ctf_http_responses_total", n, {"endpoint": endpoint, "status": code}))
+    lines += [
+        "# HELP ctf_http_requests_in_flight Requests currently being handled.",
+        "# TYPE ctf_http_requests_in_flight gauge",
+        sample("ctf_http_requests_in_flight", snap["in_flight"]),
+    ]
+    return lines
+
+def init_app(app):
+    # register ก่อน compression -> after_request ของเรารันทีหลัง (Flask รันย้อนลำดับ) เวลาเลยรวมการบีบด้วย
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
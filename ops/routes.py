@@ -0,0 +1,152 @@
+import hmac
+from flask import jsonify, Response, abort, request
+
+import startup
+import metrics
+import tracing
+import profiler
+from metrics import sample
+from sessions import SESSION_STORE
+from audit import AUDIT_LOG
+from funnel import FUNNEL
+from tokens import GATE_TOKENS, PROGRESS_TOKENS, PERMIT_TOKENS
+from config import TRACE_ENABLED, DEBUG_TOKEN, OPS_TOKEN, PROFILE_MAX_SECONDS
+from workers import CPU_POOL
+from stage3 import routes as stage3_routes
+
+from . import ops_bp
+
+# =========================================================
+# OPS / MONITORING ROUTES (สำหรับทีมจัดงาน ไม่ใช่ส่วนของโจทย์)
+# /ops/* และ /metrics ต้องมี ops token (ดู OPS_TOKEN ใน config.py)
+# =========================================================
+
+def token_matches(given: str, expected: str) -> bool:
+    # เทียบเป็น bytes: compare_digest กับ str ที่มีตัวอักษรนอก ASCII จะ TypeError (-> 500)
+    return hmac.compare_digest(given.encode("utf-8"), expected.encode("utf-8"))
+
+def require_ops_token():
+    """None if the request carries OPS_TOKEN, else the response to return (404 when no token is configured)."""
+    if not OPS_TOKEN:
+        abort(404)
+    given = request.headers.get("X-Ops-Token", "")
+    if not given:
+        scheme, _, value = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer":
+            given = value.strip()
+    if not token_matches(given, OPS_TOKEN):
+        return jsonify({"ok": False, "error": "Bad ops token."}), 403
+    return None
+
+@ops_bp.get('/ops/pool')
+def pool_stats():
+    denied = require_ops_token()
+    if denied:
+        return denied
+    return jsonify(CPU_POOL.snapshot())
+
+@ops_bp.get('/ops/funnel')
+def funnel_snapshot():
+    denied = require_ops_token()
+    if denied:
+        return denied
+    resp = Response(FUNNEL.snapshot_json(), mimetype="application/json")
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@ops_bp.get('/ops/startup')
+def startup_profile():
+    denied = require_ops_token()
+    if denied:
+        return denied
+    return jsonify(startup.snapshot())
+
+@ops_bp.get('/ops/circuit')
+def circuit_stats():
+    denied = require_ops_token()
+    if denied:
+        return denied
+    return jsonify(stage3_routes.circuit_stats())
+
+def _app_metrics() -> list:
+    """Gauges/counters from the pool, session store, token caches and circuit table."""
+    pool = CPU_POOL.snapshot()
+    lines = [
+        "# TYPE ctf_cpu_pool_pending gauge",
+        sample("ctf_cpu_pool_pending", pool["pending"]),
+        "# TYPE ctf_cpu_pool_calls_total counter",
+    ]
+    for name, ep in pool["endpoints"].items():
+        lines.append(sample("ctf_cpu_pool_calls_total", ep["calls"], {"endpoint": name}))
+    lines.append("# TYPE ctf_cpu_pool_shed_total counter")
+    for name, ep in pool["endpoints"].items():
+        lines.append(sample("ctf_cpu_pool_shed_total", ep["shed"], {"endpoint": name}))
+
+    sessions = SESSION_STORE.stats()
+    lines += ["# TYPE ctf_sessions gauge", sample("ctf_sessions", sessions["size"], {"backend": sessions["backend"]})]
+    if "evicted" in sessions:
+        lines.append("# TYPE ctf_sessions_evicted_total counter")
+        for reason, n in sessions["evicted"].items():
+            lines.append(sample("ctf_sessions_evicted_total", n, {"reason": reason}))
+
+    caches = [(kind, codec.cache.stats()) for kind, codec in
+              (("gate", GATE_TOKENS), ("progress", PROGRESS_TOKENS), ("permit", PERMIT_TOKENS))]
+    for name, field, kind_ in (("ctf_token_cache_hits_total", "hits", "counter"),
+                               ("ctf_token_cache_misses_total", "misses", "counter"),
+                               ("ctf_token_cache_entries", "size", "gauge")):
+        lines.append(f"# TYPE {name} {kind_}")
+        lines += [sample(name, cache[field], {"token": kind}) for kind, cache in caches]
+
+    audit = AUDIT_LOG.stats()
+    lines += [
+        "# TYPE ctf_audit_events_written_total counter", sample("ctf_audit_events_written_total", audit["written"]),
+        "# TYPE ctf_audit_events_dropped_total counter", sample("ctf_audit_events_dropped_total", audit["dropped"]),
+        "# TYPE ctf_audit_events_buffered gauge", sample("ctf_audit_events_buffered", audit["buffered"]),
+    ]
+
+    lines.append("# TYPE ctf_circuit_outcomes_total counter")
+    for mask, n in stage3_routes.circuit_stats()["hits"].items():
+        lines.append(sample("ctf_circuit_outcomes_total", n, {"breakers": mask}))
+    return lines
+
+@ops_bp.get('/metrics')
+def metrics_text():
+    # Prometheus: ตั้ง authorization / bearer_token ของ scrape job เป็น ops token
+    denied = require_ops_token()
+    if denied:
+        return denied
+    body = "\n".join(metrics.render_http() + _app_metrics()) + "\n"
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@ops_bp.get('/debug/traces')
+def traces():
+    # เปิดเฉพาะตอน CTF_TRACE=1 และต้องมี ops token (trace มีข้อมูล request ของผู้เล่น)
+    if not TRACE_ENABLED:
+        abort(404)
+    denied = require_ops_token()
+    if denied:
+        return denied
+    return jsonify(tracing.chrome_trace())
+
+@ops_bp.get('/debug/profile')
+def profile():
+    # ปิดอยู่ถ้าไม่ได้ตั้ง CTF_DEBUG_TOKEN
+    if not DEBUG_TOKEN:
+        abort(404)
+    if not token_matches(request.headers.get("X-Debug-Token", ""), DEBUG_TOKEN):
+        return jsonify({"ok": False, "error": "Bad debug token."}), 403
+    seconds = min(max(request.args.get("seconds", 5, type=float), 0.1), PROFILE_MAX_SECONDS)
+    top = request.args.get("top", 20, type=int)
+    try:
+        stacks, rounds = profiler.sample(seconds)
+    except profiler.ProfilerBusy:
+        return jsonify({"ok": False, "error": "A profile is already running."}), 409
+    if request.args.get("format") == "collapsed":
+        return Response(profiler.collapsed(stacks), mimetype="text/plain")
+    return jsonify({
+        "ok": True,
+        "seconds": seconds,
+        "samples": rounds,
+        "top": profiler.top_functions(stacks, top),
+        "collapsed": profiler.collapsed(stacks),
+    })
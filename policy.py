@@ -0,0 +1,58 @@
+from typing import Optional
+
+from config import ACCESS_MATRIX, ROLES, MLS_LEVEL
+
+# =========================================================
+# ACCESS-CONTROL POLICY (compiled ตอน start)
+# ACCESS_MATRIX / ROLES / MLS_LEVEL -> ตัวเลขล้วน:
+#   role      -> role id
+#   permission -> bit (1 << i)      role id -> bitmask ของ permission ที่อนุญาต
+#   clearance -> level (int)        label ที่ไม่รู้จัก = สูงกว่าทุก level (deny)
+# decide() = 2 dict lookup (key เป็น str ที่ hash ไว้แล้ว) + AND + compare
+# (ลอง key เป็น tuple (role, clearance) แล้ว ช้ากว่า: ต้อง hash tuple ใหม่ทุกครั้ง)
+# =========================================================
+class CompiledPolicy:
+    def __init__(self, matrix: dict, roles: list, levels: dict):
+        names = list(dict.fromkeys([*roles, *matrix]))
+        self.role_ids = {name: i for i, name in enumerate(names)}
+
+        perms = dict.fromkeys(p for grants in matrix.values() for p in grants)
+        self.permission_bits = {p: 1 << i for i, p in enumerate(perms)}
+
+        self.role_masks = [0] * len(names)
+        for role, grants in matrix.items():
+            mask = 0
+            for perm, allowed in grants.items():
+                if allowed:
+                    mask |= self.permission_bits[perm]
+            self.role_masks[self.role_ids[role]] = mask
+
+        self.masks = {role: self.role_masks[rid] for role, rid in self.role_ids.items()}  # hot path
+
+        self.levels = dict(levels)
+        self.deny_level = max(levels.values(), default=0) + 1  # label ที่ไม่รู้จัก -> ไม่มีใครผ่าน
+
+    def permission_bit(self, permission: str) -> int:
+        """Bit for permission (0 = unknown -> never granted). Resolve once at import time."""
+        return self.permission_bits.get(permission, 0)
+
+    def label_level(self, label: str) -> int:
+        return self.levels.get(label, self.deny_level)
+
+    def is_allowed(self, role: str, permission: str) -> bool:
+        return (self.masks.get(role, 0) & self.permission_bit(permission)) != 0
+
+    def clearance_at_least(self, user_clearance: str, need: str) -> bool:
+        return self.levels.get(user_clearance, -1) >= self.label_level(need)
+
+    def decide(self, session: Optional[dict], permission: int, label: int = 0) -> bool:
+        """
+        session มี role + clearance; permission = permission_bit(...), label = label_level(...)
+        ไม่รู้จัก role / clearance -> deny
+        """
+        if not session:
+            return False
+        return ((self.masks.get(session.get("role"), 0) & permission) != 0
+                and self.levels.get(session.get("clearance"), -1) >= label)
+
+POLICY = CompiledPolicy(ACCESS_MATRIX, ROLES, MLS_LEVEL)
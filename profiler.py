@@ -0,0 +1,73 @@
+import sys
+import time
+import threading
+from collections import Counter
+
+from config import PROFILE_INTERVAL_SECONDS
+
+# =========================================================
+# SAMPLING PROFILER
+# ทุก PROFILE_INTERVAL_SECONDS อ่าน stack ของทุก thread ด้วย sys._current_frames()
+# ไม่ hook function call (ไม่เหมือน cProfile) -> overhead ต่ำ ใช้กับ worker ที่รันจริงได้
+# ผลลัพธ์: collapsed stacks (flamegraph.pl / speedscope) + ตาราง top-N ของ function ในโค้ดเรา
+# =========================================================
+APP_MODULES = ("stage1", "stage2", "stage3", "utils")
+
+_busy = threading.Lock()  # ทีละ profile
+
+class ProfilerBusy(Exception):
+    pass
+
+def _frame_label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+def _is_app_frame(label: str) -> bool:
+    module = label.split(":", 1)[0]
+    return module.split(".", 1)[0] in APP_MODULES
+
+def sample(seconds: float, interval: float = PROFILE_INTERVAL_SECONDS) -> tuple:
+    """(Counter of stacks root->leaf, number of sampling rounds). Skips the calling thread."""
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks = Counter()
+        rounds = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(f"thread:{names.get(ident, ident)}")
+                stacks[tuple(reversed(stack))] += 1
+            rounds += 1
+            time.sleep(interval)
+        return stacks, rounds
+    finally:
+        _busy.release()
+
+def collapsed(stacks: Counter) -> str:
+    """Brendan Gregg collapsed format: 'root;child;leaf count' per line."""
+    return "".join(f"{';'.join(stack)} {n}\n" for stack, n in stacks.most_common())
+
+def top_functions(stacks: Counter, n: int = 20) -> list:
+    """App functions by inclusive samples (on the stack) with self samples (leaf-most app frame)."""
+    inclusive, self_ = Counter(), Counter()
+    for stack, count in stacks.items():
+        app_frames = [label for label in stack if _is_app_frame(label)]
+        if not app_frames:
+            continue
+        for label in set(app_frames):
+            inclusive[label] += count
+        self_[app_frames[-1]] += count
+    total = sum(stacks.values()) or 1
+    return [
+        {"function": label, "inclusive": hits, "self": self_[label],
+         "inclusive_pct": round(hits * 100 / total, 2)}
+        for label, hits in inclusive.most_common(n)
+    ]
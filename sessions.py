@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import heapq
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from config import (
+    SESSION_TTL_SECONDS, SESSION_IDLE_SECONDS, SESSION_MAX,
+    SESSION_BACKEND, SESSION_DB_PATH, SESSION_SWEEP_INTERVAL_SECONDS, SESSION_READ_CACHE_SECONDS,
+)
+
+# =========================================================
+# SESSION STORE
+# =========================================================
+class SessionStore:
+    """Maps sid -> session record. Backends decide how records are kept and expired."""
+
+    def get(self, sid: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def put(self, sid: str, record: dict):
+        raise NotImplementedError
+
+    def delete(self, sid: str):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process store with three eviction rules:
+    - idle: OrderedDict kept in last-access order -> หมดอายุจากหัวแถว
+    - absolute TTL: expiry heap ของ (ts + ttl, sid)
+    - max sessions: เกิน cap -> ทิ้งตัวที่ไม่ได้ใช้นานสุด (LRU)
+    ทุก get/put ทำ eviction แบบ amortized O(1) (+ heap push ตอน put)
+    heap entry ของ session ที่ถูกลบไปแล้ว (idle / LRU / delete) ค้างอยู่ได้
+    -> heap ยาวเกิน 2 x max_sessions เมื่อไหร่ สร้างใหม่จาก session ที่ยังอยู่ (ขนาดไม่โตตามจำนวน login)
+    """
+
+    def __init__(self, ttl: int = SESSION_TTL_SECONDS, idle: int = SESSION_IDLE_SECONDS,
+                 max_sessions: int = SESSION_MAX, clock=time.time):
+        self.ttl = ttl
+        self.idle = idle
+        self.max_sessions = max_sessions
+        self._clock = clock
+        self._data = OrderedDict()  # {sid: [record, last_seen, exp]}
+        self._expiry = []           # heap of (exp, sid)
+        self._lock = threading.Lock()
+        self._evicted = {"idle": 0, "expired": 0, "lru": 0}
+
+    def _evict(self, now: float):
+        data = self._data
+        while data:
+            sid, entry = next(iter(data.items()))
+            if now - entry[1] <= self.idle:
+                break
+            del data[sid]
+            self._evicted["idle"] += 1
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            exp, sid = heapq.heappop(expiry)
+            entry = data.get(sid)
+            if entry is not None and entry[2] == exp:  # entry เก่าของ sid ที่ put ใหม่แล้ว -> ข้าม
+                del data[sid]
+                self._evicted["expired"] += 1
+
+    def get(self, sid: str) -> Optional[dict]:
+        now = self._clock()
+        with self._lock:
+            self._evict(now)
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            entry[1] = now
+            self._data.move_to_end(sid)
+            return entry[0]
+
+    def put(self, sid: str, record: dict):
+        now = self._clock()
+        with self._lock:
+            self._evict(now)
+            exp = record.get("ts", now) + self.ttl
+            self._data[sid] = [record, now, exp]
+            self._data.move_to_end(sid)
+            heapq.heappush(self._expiry, (exp, sid))
+            while len(self._data) > self.max_sessions:
+                self._data.popitem(last=False)
+                self._evicted["lru"] += 1
+            if len(self._expiry) > 2 * self.max_sessions:
+                self._expiry = [(entry[2], key) for key, entry in self._data.items()]
+                heapq.heapify(self._expiry)
+
+    def delete(self, sid: str):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "size": len(self._data), "max": self.max_sessions,
+                    "evicted": dict(self._evicted)}
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Shared store for several worker processes on one host (SQLite in WAL mode).
+    - connection ต่อ thread (สร้างใหม่หลัง fork), SQL คงที่ -> sqlite3 cache prepared statement ให้
+    - last_seen อัปเดตไม่บ่อยกว่า touch_every วินาที (ไม่เขียน DB ทุก request)
+    - ลบ session หมดอายุ / เกิน cap เป็น batch ทุก SESSION_SWEEP_INTERVAL_SECONDS
+    - read-through cache ต่อ worker อายุ SESSION_READ_CACHE_SECONDS
+      (session ที่ถูกลบจาก worker อื่นอาจยังเห็นได้ไม่เกินช่วงนี้)
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        sid TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        last_seen REAL NOT NULL,
+        exp REAL NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen);
+    CREATE INDEX IF NOT EXISTS sessions_exp ON sessions (exp);
+    """
+    _SELECT = "SELECT data, last_seen, exp FROM sessions WHERE sid = ?"
+    _UPSERT = "INSERT OR REPLACE INTO sessions (sid, data, last_seen, exp) VALUES (?, ?, ?, ?)"
+    _TOUCH = "UPDATE sessions SET last_seen = ? WHERE sid = ?"
+    _DELETE = "DELETE FROM sessions WHERE sid = ?"
+    _SWEEP = "DELETE FROM sessions WHERE exp <= ? OR last_seen < ?"
+    _CAP = ("DELETE FROM sessions WHERE sid IN "
+            "(SELECT sid FROM sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?)")
+    _COUNT = "SELECT COUNT(*) FROM sessions"
+
+    def __init__(self, path: str = SESSION_DB_PATH, ttl: int = SESSION_TTL_SECONDS,
+                 idle: int = SESSION_IDLE_SECONDS, max_sessions: int = SESSION_MAX,
+                 sweep_interval: float = SESSION_SWEEP_INTERVAL_SECONDS,
+                 cache_seconds: float = SESSION_READ_CACHE_SECONDS,
+                 touch_every: float = 60, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.idle = idle
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self.cache_seconds = cache_seconds
+        self.touch_every = min(touch_every, idle)
+        self._clock = clock
+        self._local = threading.local()
+        self._cache = {}  # {sid: (record, last_seen, exp, cached_at)}
+        self._cache_max = 4096
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        with self._conn() as conn:
+            conn.executescript(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is None or local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, cached_statements=32)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            local.conn, local.pid = conn, os.getpid()
+        return conn
+
+    def _alive(self, last_seen: float, exp: float, now: float) -> bool:
+        return exp > now and now - last_seen <= self.idle
+
+    def _maybe_sweep(self, now: float):
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        with self._lock:
+            if now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+            # cache ต่อ worker ก็ล้างทิ้งพร้อมกัน (ถูกกว่า evict ทีละตัว)
+            self._cache = {}
+        with self._conn() as conn:
+            conn.execute(self._SWEEP, (now, now - self.idle))
+            conn.execute(self._CAP, (self.max_sessions,))
+
+    def get(self, sid: str) -> Optional[dict]:
+        now = self._clock()
+        self._maybe_sweep(now)
+        hit = self._cache.get(sid)
+        if hit is not None and now - hit[3] <= self.cache_seconds and self._alive(hit[1], hit[2], now):
+            return hit[0]
+
+        row = self._conn().execute(self._SELECT, (sid,)).fetchone()
+        if row is None:
+            self._cache.pop(sid, None)
+            return None
+        data, last_seen, exp = row
+        if not self._alive(last_seen, exp, now):
+            self.delete(sid)
+            return None
+        if now - last_seen >= self.touch_every:
+            with self._conn() as conn:
+                conn.execute(self._TOUCH, (now, sid))
+            last_seen = now
+        record = json.loads(data)
+        if len(self._cache) >= self._cache_max:
+            self._cache = {}
+        self._cache[sid] = (record, last_seen, exp, now)
+        return record
+
+    def put(self, sid: str, record: dict):
+        now = self._clock()
+        self._maybe_sweep(now)
+        exp = record.get("ts", now) + self.ttl
+        with self._conn() as conn:
+            conn.execute(self._UPSERT, (sid, json.dumps(record, separators=(",", ":")), now, exp))
+        self._cache[sid] = (record, now, exp, now)
+
+    def delete(self, sid: str):
+        self._cache.pop(sid, None)
+        with self._conn() as conn:
+            conn.execute(self._DELETE, (sid,))
+
+    def stats(self) -> dict:
+        size = self._conn().execute(self._COUNT).fetchone()[0]
+        return {"backend": "sqlite", "size": size, "max": self.max_sessions,
+                "worker_cache": len(self._cache)}
+
+def create_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend!r} (expected 'memory' or 'sqlite')")
+
+SESSION_STORE: SessionStore = create_session_store()
@@ -1,16 +1,14 @@
 
+import os
 import json
 import secrets
+import threading
 import hashlib
 from typing import Tuple
-from flask import jsonify, Blueprint, request, render_template_string, make_response
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.primitives import padding, hashes, serialization
+from flask import Blueprint, request, render_template_string
 
-from config import STAGE2_PASSWORD_PLAINTEXT
-from utils import render_page, b64url_encode
+from config import STAGE2_PASSWORD_PLAINTEXT, RSA_KEY_FILE, RSA_KEY_SIZE
+from utils import render_page, b64url_encode, strong_etag, immutable_response
 
 from . import stage1_bp
 
@@ -30,11 +28,72 @@ DH_B_SECRET = 41
 
 # RSA Key (For consistent signature if needed, though blueprint focuses on AES)
 # We keep it for the "Puzzle" completeness if the user wants to verify signature later.
-RSA_PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
-RSA_PUBLIC_PEM = RSA_PRIVATE_KEY.public_key().public_bytes(
-    encoding=serialization.Encoding.PEM,
-    format=serialization.PublicFormat.SubjectPublicKeyInfo,
-).decode("utf-8")
+# ไม่ generate ตอน import แล้ว (2048-bit ใช้เวลาหลายร้อย ms ทุกครั้งที่ worker start)
+# -> load จาก RSA_KEY_FILE หรือ generate ตอนใช้ครั้งแรก (ดู config.py)
+_RSA_LOCK = threading.Lock()
+_rsa_private_key = None
+_rsa_public_pem = None
+
+def _load_rsa_key_file():
+    from cryptography.hazmat.primitives import serialization
+    with open(RSA_KEY_FILE, "rb") as f:
+        return serialization.load_pem_private_key(f.read(), password=None)
+
+def _load_or_generate_rsa_key():
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    if RSA_KEY_FILE and os.path.exists(RSA_KEY_FILE):
+        return _load_rsa_key_file()
+    key = rsa.generate_private_key(public_exponent=65537, key_size=RSA_KEY_SIZE)
+    if RSA_KEY_FILE:
+        pem = key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+        # หลาย worker อาจ generate พร้อมกัน: เขียนไฟล์ชั่วคราวให้ครบก่อน แล้ว link เข้าชื่อจริง (atomic)
+        # ใครช้ากว่า (FileExistsError) -> ใช้ key ที่อีกตัวเขียนไว้ ทุก worker จะได้ key เดียวกัน
+        tmp = f"{RSA_KEY_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(pem)
+            os.link(tmp, RSA_KEY_FILE)
+        except FileExistsError:
+            return _load_rsa_key_file()
+        finally:
+            os.unlink(tmp)
+    return key
+
+def get_rsa_private_key():
+    global _rsa_private_key
+    if _rsa_private_key is None:
+        with _RSA_LOCK:
+            if _rsa_private_key is None:
+                _rsa_private_key = _load_or_generate_rsa_key()
+    return _rsa_private_key
+
+def get_rsa_public_pem() -> str:
+    global _rsa_public_pem
+    if _rsa_public_pem is None:
+        from cryptography.hazmat.primitives import serialization
+        _rsa_public_pem = get_rsa_private_key().public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        ).decode("utf-8")
+    return _rsa_public_pem
+
+def preload_rsa_key():
+    """Load/generate the keypair now (call in the master process before forking workers)."""
+    get_rsa_public_pem()
+
+def __getattr__(name):
+    # ยังเข้าถึงแบบเดิม routes.RSA_PRIVATE_KEY / routes.RSA_PUBLIC_PEM ได้ (คำนวณตอนถูกเรียกครั้งแรก)
+    if name == "RSA_PRIVATE_KEY":
+        return get_rsa_private_key()
+    if name == "RSA_PUBLIC_PEM":
+        return get_rsa_public_pem()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def stage1_compute_shared_secret() -> int:
     # Formula: s = A^b mod p
@@ -47,6 +106,9 @@ def stage1_derive_key_from_s(s: int) -> bytes:
 
 def stage1_encrypt_handshake_ecb(key32: bytes) -> str:
     # Ciphertext (The Locked Box)
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.backends import default_backend
     # Result: {"pass": "SUT_Gate_Open"}
     
     payload = {"pass": STAGE2_PASSWORD_PLAINTEXT}
@@ -63,16 +125,11 @@ def stage1_encrypt_handshake_ecb(key32: bytes) -> str:
     return ct.hex()
 
 # =========================================================
-# ROUTES
+# STAGE 1 PAYLOADS (เนื้อหาคงที่ -> build ครั้งเดียวตอน import + strong ETag)
 # =========================================================
 
-@stage1_bp.route('/stage1')
-def index():
-    s = stage1_compute_shared_secret()
-    key32 = stage1_derive_key_from_s(s) 
-    
-    # User Request: Text Message with Color Codes
-    ct_hex = """รบกวนทีมกราฟิกเช็กชุดสีพวกนี้ให้หน่อยครับ ว่าเอาไปใช้กับธีมใหม่ได้ไหม:
+# User Request: Text Message with Color Codes
+STAGE1_CT_HEX = """รบกวนทีมกราฟิกเช็กชุดสีพวกนี้ให้หน่อยครับ ว่าเอาไปใช้กับธีมใหม่ได้ไหม:
 
 Primary: #f152bf
 
@@ -95,9 +152,11 @@ Info: #0f1c65
 Link: #277e0b
 
 Icon: #d7a6 """
-    # ct_hex = stage1_encrypt_handshake_ecb(key32)
+# STAGE1_CT_HEX = stage1_encrypt_handshake_ecb(stage1_derive_key_from_s(stage1_compute_shared_secret()))
 
-    body = f"""
+STAGE1_PAGE = render_page(
+    title="Stage 1 — Secure Handshake",
+    body_html=f"""
     <div class="grid">
       <div class="card">
         <h1>🔐 Stage 1 — หากุญแจมาไขกล่อง</h1>
@@ -126,7 +185,7 @@ Server Public Key (A): {DH_A_PUB}</pre>
       </div>
 
       <div class="card half">
-        <textarea rows="15" readonly id="ct" style="width:100%; font-family:monospace; color:#0f0; background:#000; border:1px solid #333; padding:10px;">{ct_hex}</textarea>
+        <textarea rows="15" readonly id="ct" style="width:100%; font-family:monospace; color:#0f0; background:#000; border:1px solid #333; padding:10px;">{STAGE1_CT_HEX}</textarea>
         <button class="btn" onclick="copyText('ct')">Copy </button>
         
         <p class="mt-2 text-small muted">
@@ -155,25 +214,10 @@ Server Public Key (A): {DH_A_PUB}</pre>
       </script>
     </div>
     """
-    resp_str = render_page(
-        title="Stage 1 — Secure Handshake",
-        body_html=body
-    )
-    resp = make_response(resp_str)
-    
-    # Add Simulated Headers (Visible in F12 Network Tab)
-    resp.headers["X-Simulated-Protocol"] = "TLS 1.3"
-    resp.headers["X-Simulated-Cipher"] = "AES-256-ECB"
-    
-    return resp
+)
+STAGE1_PAGE_ETAG = strong_etag(STAGE1_PAGE)
 
-@stage1_bp.route('/stage1/handshake.json')
-def handshake_json():
-    s = stage1_compute_shared_secret()
-    key32 = stage1_derive_key_from_s(s)
-    
-    # User Request: Text Message with Color Codes
-    ct_hex = """รบกวนทีมกราฟิกเช็กชุดสีพวกนี้ให้หน่อยครับ ว่าเอาไปใช้กับธีมใหม่ได้ไหม:
+STAGE1_HANDSHAKE_CT_HEX = """รบกวนทีมกราฟิกเช็กชุดสีพวกนี้ให้หน่อยครับ ว่าเอาไปใช้กับธีมใหม่ได้ไหม:
 
 Primary: #f152bf
 
@@ -196,16 +240,35 @@ Info: #0f1c65
 Link: #277e0b
 
 Icon: #d7a600 (เติม 00 ให้ครบ)"""
-    # ct_hex = stage1_encrypt_handshake_ecb(key32)
+# STAGE1_HANDSHAKE_CT_HEX = stage1_encrypt_handshake_ecb(stage1_derive_key_from_s(stage1_compute_shared_secret()))
+
+STAGE1_HANDSHAKE_JSON = json.dumps({
+    "public_parameters": {
+        "p": DH_P,
+        "g": DH_G,
+        "A": DH_A_PUB
+    },
+    "hint": "Last 2 digits of Cyber subject code (b=41)",
+    "ciphertext_hex": STAGE1_HANDSHAKE_CT_HEX,
+    "encryption_mode": "AES-256-ECB",
+    "key_derivation": "SHA-256(str(s))"
+}, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+STAGE1_HANDSHAKE_ETAG = strong_etag(STAGE1_HANDSHAKE_JSON)
+
+# =========================================================
+# ROUTES
+# =========================================================
+
+@stage1_bp.route('/stage1')
+def index():
+    resp = immutable_response(STAGE1_PAGE, STAGE1_PAGE_ETAG)
+    
+    # Add Simulated Headers (Visible in F12 Network Tab)
+    resp.headers["X-Simulated-Protocol"] = "TLS 1.3"
+    resp.headers["X-Simulated-Cipher"] = "AES-256-ECB"
     
-    return jsonify({
-        "public_parameters": {
-            "p": DH_P,
-            "g": DH_G,
-            "A": DH_A_PUB
-        },
-        "hint": "Last 2 digits of Cyber subject code (b=41)",
-        "ciphertext_hex": ct_hex,
-        "encryption_mode": "AES-256-ECB",
-        "key_derivation": "SHA-256(str(s))"
-    })
+    return resp
+
+@stage1_bp.route('/stage1/handshake.json')
+def handshake_json():
+    return immutable_response(STAGE1_HANDSHAKE_JSON, STAGE1_HANDSHAKE_ETAG, mimetype="application/json")
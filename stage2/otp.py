@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import zlib
+import time
+import hmac
+import base64
+import struct
+import hashlib
+import threading
+from io import BytesIO
+from typing import Optional
+
+from config import (
+    OTP_WINDOW_SECONDS, STAGE2_OTP_SEED,
+    OTP_QR_BOX_SIZE, OTP_QR_BORDER, OTP_QR_PNG_ZLIB_LEVEL, OTP_QR_PNG_BACKEND,
+    OTP_STREAM_MAX_WINDOWS, OTP_STREAM_RETRY_MS,
+)
+from tracing import traced
+
+# =========================================================
+# STAGE 2 OTP + QR
+# OTP เปลี่ยนทุก OTP_WINDOW_SECONDS และ seed คงที่ -> QR ของแต่ละ window render ครั้งเดียวพอ
+# =========================================================
+def otp_window(now: Optional[float] = None, window: int = OTP_WINDOW_SECONDS) -> int:
+    return int((time.time() if now is None else now) // window)
+
+def seconds_left_in_window(now: float, window: int = OTP_WINDOW_SECONDS) -> int:
+    return max(1, int(window - (now % window)))
+
+@traced
+def current_otp_code(seed: str, window: int = OTP_WINDOW_SECONDS, t: Optional[int] = None) -> str:
+    if t is None:
+        t = otp_window(window=window)
+    msg = str(t).encode("utf-8")
+    key = seed.encode("utf-8")
+    digest = hmac.new(key, msg, hashlib.sha256).digest()
+    num = int.from_bytes(digest[-4:], "big") % 1_000_000
+    return f"{num:06d}"
+
+def otp_qr_text(seed: str, t: Optional[int] = None) -> str:
+    otp = current_otp_code(seed, t=t)
+    qr_data = {
+        "otp": otp,
+        "attrs": {
+            "location": "SUT-F1",
+            "clearance": "SECRET"
+        }
+    }
+    return json.dumps(qr_data, separators=(",", ":"))
+
+def qr_matrix(text: str) -> list:
+    """QR modules as rows of bools (True = dark), without the quiet zone."""
+    import qrcode  # lazy: โหลดตอน render QR ครั้งแรก ไม่ใช่ตอน start
+    qr = qrcode.QRCode(border=0)
+    qr.add_data(text)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+# ===== QR writers =====
+def render_qr_svg(matrix: list, box: int = OTP_QR_BOX_SIZE, border: int = OTP_QR_BORDER) -> bytes:
+    """SVG writer (ไม่ใช้ PIL): 1 path, dark modules ที่ติดกันในแถวรวมเป็นสี่เหลี่ยมเดียว"""
+    size = len(matrix) + 2 * border
+    parts = []
+    for y, row in enumerate(matrix):
+        x, n = 0, len(row)
+        while x < n:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < n and row[x]:
+                x += 1
+            parts.append(f"M{start + border} {y + border}h{x - start}v1h-{x - start}z")
+    px = size * box
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{px}" height="{px}" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path fill="#000" d="{"".join(parts)}"/></svg>'
+    ).encode("utf-8")
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def render_qr_png(matrix: list, box: int = OTP_QR_BOX_SIZE, border: int = OTP_QR_BORDER,
+                  level: int = OTP_QR_PNG_ZLIB_LEVEL) -> bytes:
+    """1-bit palette PNG writer (ไม่ใช้ PIL): index 0 = ขาว, 1 = ดำ"""
+    modules = len(matrix) + 2 * border
+    width = modules * box
+    row_bytes = (width + 7) // 8
+    quiet = b"\x00" + bytes(row_bytes)  # filter byte 0 + แถวขาวล้วน
+    rows = [quiet] * (border * box)
+    for row in matrix:
+        bits = "0" * (border * box) + "".join(("1" * box) if dark else ("0" * box) for dark in row)
+        bits = bits.ljust(row_bytes * 8, "0")
+        line = b"\x00" + int(bits, 2).to_bytes(row_bytes, "big")
+        rows.extend([line] * box)
+    rows.extend([quiet] * (border * box))
+    ihdr = struct.pack(">IIBBBBB", width, width, 1, 3, 0, 0, 0)  # bit depth 1, color type 3 (palette)
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", ihdr),
+        _png_chunk(b"PLTE", b"\xff\xff\xff\x00\x00\x00"),
+        _png_chunk(b"IDAT", zlib.compress(b"".join(rows), level)),
+        _png_chunk(b"IEND", b""),
+    ))
+
+def render_qr_png_pil(text: str, box: int = OTP_QR_BOX_SIZE, border: int = OTP_QR_BORDER) -> bytes:
+    """Legacy backend: qrcode + PIL rasterizer."""
+    import qrcode
+    img = qrcode.make(text, box_size=box, border=border)
+    bio = BytesIO()
+    img.save(bio, format="PNG")
+    return bio.getvalue()
+
+QR_MIMETYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+@traced
+def make_otp_qr(seed: str, t: Optional[int] = None, fmt: str = "png") -> bytes:
+    text = otp_qr_text(seed, t)
+    if fmt == "svg":
+        return render_qr_svg(qr_matrix(text))
+    if OTP_QR_PNG_BACKEND == "pil":
+        return render_qr_png_pil(text)
+    return render_qr_png(qr_matrix(text))
+
+PRERENDER_MAX_BACKOFF_SECONDS = 30.0
+
+class WindowBroadcaster:
+    """One publisher (pre-render thread) -> N SSE clients. Event bytes are built once per window."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._window = -1
+        self._event = b""
+        self._subscribers = []  # callback(window, event) เช่น feed ของ event loop ใน asgi.py
+
+    @property
+    def latest(self) -> int:
+        return self._window
+
+    def publish(self, t: int, event: bytes):
+        with self._cond:
+            self._window, self._event = t, event
+            self._cond.notify_all()
+        for callback in list(self._subscribers):
+            callback(t, event)
+
+    def subscribe(self, callback):
+        """Call callback(window, event) from the publisher thread on every new window."""
+        self._subscribers.append(callback)
+
+    def wait_next(self, after: int, timeout: float):
+        """Block until a window newer than `after` is published (or timeout). Returns (window, event)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._window > after, timeout)
+            return self._window, self._event
+
+class QRWindowCache:
+    """
+    (window index, format) -> encoded image (png / svg)
+    - render แค่ครั้งเดียวต่อ window (request อื่นที่มาพร้อมกันรอผลเดียวกัน)
+    - thread เบื้องหลัง render window t+1 ไว้ก่อนถึงรอยต่อ -> ไม่มี CPU spike ตอนทุกคนโหลดรูปใหม่
+    - เก็บแค่ window ปัจจุบันกับถัดไป
+    - ขึ้น window ใหม่ -> broadcast event เดียวให้ทุก SSE client (/stage2/otp/stream)
+    NOTE: PNG ของ t+1 ห้ามส่งออกก่อนถึง window นั้น (จะเผย OTP ล่วงหน้า) -> route ขอ otp_window() เสมอ
+    """
+
+    def __init__(self, seed: str = STAGE2_OTP_SEED, window: int = OTP_WINDOW_SECONDS):
+        self.seed = seed
+        self.window = window
+        self._images = {}  # {(window, fmt): bytes}
+        self._render_lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self.broadcaster = WindowBroadcaster()
+
+    def cached(self, t: int, fmt: str = "png") -> Optional[bytes]:
+        return self._images.get((t, fmt))
+
+    @traced
+    def get(self, t: int, fmt: str = "png") -> bytes:
+        key = (t, fmt)
+        img = self._images.get(key)
+        if img is not None:
+            return img
+        with self._render_lock:
+            img = self._images.get(key)
+            if img is None:
+                img = make_otp_qr(self.seed, t, fmt)
+                images = {k: v for k, v in self._images.items() if k[0] >= t - 1}
+                images[key] = img
+                self._images = images
+        return img
+
+    def _prerender_running(self) -> bool:
+        return self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive()
+
+    def ensure_prerender(self):
+        """Start the pre-render thread in this process (lazily, so it also runs after a fork or if it died)."""
+        if self._prerender_running():
+            return
+        with self._render_lock:
+            if self._prerender_running():
+                return
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self._prerender_loop, name="otp-qr-prerender", daemon=True)
+            self._thread.start()
+
+    def window_event(self, t: int, remaining: int) -> bytes:
+        """SSE event for window t: seconds left + the QR as a data URI (client ไม่ต้องโหลดรูปซ้ำ)."""
+        qr = "data:image/png;base64," + base64.b64encode(self.get(t)).decode("ascii")
+        data = json.dumps({"window": t, "remaining": remaining, "qr": qr}, separators=(",", ":"))
+        return f"id: {t}\nevent: otp-window\ndata: {data}\n\n".encode("utf-8")
+
+    def stream(self, until: float, last_event_id: int = -1, max_windows: int = OTP_STREAM_MAX_WINDOWS,
+               heartbeat: float = 15.0):
+        """
+        SSE body: the current window (unless the client already has it, per Last-Event-ID), then
+        one event per new window. Ends after max_windows events or at `until` (gate exp) so one
+        client never holds a WSGI thread for long; EventSource reconnects and resumes by id.
+        """
+        yield f"retry: {OTP_STREAM_RETRY_MS}\n\n".encode("ascii")
+        now = time.time()
+        last = otp_window(now, self.window)
+        sent = 0
+        if last > last_event_id:
+            yield self.window_event(last, seconds_left_in_window(now, self.window))
+            sent += 1
+        while sent < max_windows and time.time() < until:
+            t, event = self.broadcaster.wait_next(last, min(heartbeat, max(0.0, until - time.time())))
+            if t > last:
+                last = t
+                sent += 1
+                yield event
+            else:
+                yield b": ping\n\n"
+
+    def _prerender_once(self) -> float:
+        """Render/publish the current window and pre-render the next; returns seconds to sleep."""
+        now = time.time()
+        t = otp_window(now, self.window)
+        self.get(t)
+        if t > self.broadcaster.latest:
+            self.broadcaster.publish(t, self.window_event(t, seconds_left_in_window(time.time(), self.window)))
+        self.get(t + 1)
+        self.get(t + 1, "svg")
+        # ตื่นหลังรอยต่อ window นิดหน่อย แล้ว render window ถัดไปต่อ
+        return max(0.05, (t + 1) * self.window - time.time() + 0.05)
+
+    def _prerender_loop(self):
+        # render พังรอบไหนก็ log แล้วลองใหม่ (backoff) ไม่ให้ thread ตาย -> SSE จะเหลือแต่ ping
+        backoff = 1.0
+        while True:
+            try:
+                delay = self._prerender_once()
+                backoff = 1.0
+            except Exception as e:
+                print(f"[otp-qr] pre-render failed: {e!r} (retry in {backoff:.0f}s)", file=sys.stderr)
+                delay, backoff = backoff, min(backoff * 2, PRERENDER_MAX_BACKOFF_SECONDS)
+            time.sleep(delay)
+
+QR_CACHE = QRWindowCache()
@@ -1,45 +1,37 @@
 
-import json
 import time
 import hmac
 import hashlib
 import secrets
 from urllib.parse import quote
-from io import BytesIO
-import qrcode
-from flask import request, make_response, send_file, Blueprint
+from functools import lru_cache
+from flask import request, make_response, Response, Blueprint
 
 from config import (
-    STAGE2_PASSWORD_PLAINTEXT, STAGE2_GATE_TTL_SECONDS, STAGE2_GATE_KEY,
-    OTP_WINDOW_SECONDS, USERS,
-    OTP_WINDOW_SECONDS, USERS,
-    STAGE2_PIN_QUESTIONS, SUT_COORDINATES, MAX_DISTANCE_KM, STAGE2_PROGRESS_KEY,
-    OTP_WINDOW_SECONDS, USERS,
-    STAGE2_PIN_QUESTIONS, SUT_COORDINATES, MAX_DISTANCE_KM, STAGE2_PROGRESS_KEY,
+    STAGE2_PASSWORD_PLAINTEXT, STAGE2_GATE_TTL_SECONDS,
+    USERS, OTP_STREAM_ENABLED,
+    STAGE2_PIN_QUESTIONS, SUT_COORDINATES, MAX_DISTANCE_KM,
     STAGE2_KEYSTROKE_TARGET_PHRASE, STAGE2_KEYSTROKE_MIN_TIME_MS, STAGE2_KEYSTROKE_MAX_TIME_MS,
-    STAGE2_MAGIC_NUMBER
+    STAGE2_MAGIC_NUMBER, STAGE2_OTP_SEED
 )
-from utils import render_page, b64url_encode, b64url_decode, new_session
+from utils import render_page, new_session
+from workers import CPU_POOL
+from tracing import traced
+from audit import record, player_id
+from funnel import FUNNEL
+from keys import derive_key
+from tokens import GATE_TOKENS, PROGRESS_TOKENS, encode_layers, decode_layers
 from . import stage2_bp
+from .otp import current_otp_code, otp_window, seconds_left_in_window, QR_CACHE, QR_MIMETYPES
 import math
 
 # ===== Layer 1: Password Gate =====
 def sign_stage2_gate() -> str:
-    payload = {"v": 1, "exp": int(time.time()) + STAGE2_GATE_TTL_SECONDS}
-    body = b64url_encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
-    sig = hmac.new(STAGE2_GATE_KEY, body.encode("utf-8"), hashlib.sha256).digest()
-    return f"{body}.{b64url_encode(sig)}"
+    return GATE_TOKENS.sign(int(time.time()) + STAGE2_GATE_TTL_SECONDS)
 
+@traced
 def verify_stage2_gate(token: str) -> bool:
-    try:
-        body, sig = token.split(".", 1)
-        expected = hmac.new(STAGE2_GATE_KEY, body.encode("utf-8"), hashlib.sha256).digest()
-        if not hmac.compare_digest(b64url_decode(sig), expected):
-            return False
-        payload = json.loads(b64url_decode(body).decode("utf-8"))
-        return int(payload.get("exp", 0)) >= int(time.time())
-    except Exception:
-        return False
+    return GATE_TOKENS.verify(token) is not None
 
 def has_stage2_gate() -> bool:
     tok = request.cookies.get("s2gate", "")
@@ -48,24 +40,15 @@ def has_stage2_gate() -> bool:
 # ===== Progress Token (track which layers completed) =====
 def sign_progress(layers: list) -> str:
     """layers = [1,2,3,4] means completed layers 1-4"""
-    payload = {"layers": layers, "exp": int(time.time()) + STAGE2_GATE_TTL_SECONDS}
-    body = b64url_encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
-    sig = hmac.new(STAGE2_PROGRESS_KEY, body.encode("utf-8"), hashlib.sha256).digest()
-    return f"{body}.{b64url_encode(sig)}"
+    return PROGRESS_TOKENS.sign(int(time.time()) + STAGE2_GATE_TTL_SECONDS, encode_layers(layers))
 
+@traced
 def verify_progress(token: str) -> list:
     """Return list of completed layers, or empty list if invalid"""
-    try:
-        body, sig = token.split(".", 1)
-        expected = hmac.new(STAGE2_PROGRESS_KEY, body.encode("utf-8"), hashlib.sha256).digest()
-        if not hmac.compare_digest(b64url_decode(sig), expected):
-            return []
-        payload = json.loads(b64url_decode(body).decode("utf-8"))
-        if int(payload.get("exp", 0)) < int(time.time()):
-            return []
-        return payload.get("layers", [])
-    except Exception:
+    verified = PROGRESS_TOKENS.verify(token)
+    if verified is None:
         return []
+    return decode_layers(verified[1])
 
 def get_progress() -> list:
     tok = request.cookies.get("s2progress", "")
@@ -76,28 +59,22 @@ def set_progress_cookie(resp, layers: list):
     resp.set_cookie("s2progress", token, httponly=True, samesite="Lax")
 
 # ===== Layer 2: PIN Challenge (Random Questions) =====
-import random
-
-# Store active questions per session
-ACTIVE_QUESTIONS = {}  # {session_id: question_index}
-
-def get_random_question():
-    """Get a random question from the pool"""
-    return random.choice(STAGE2_PIN_QUESTIONS)
+# คำถามของแต่ละคน = HMAC(key, s2gate token) mod จำนวนคำถาม
+# -> ได้คำถามเดิมตลอดอายุ gate token โดยไม่ต้องเก็บ state ฝั่ง server (เดิมเก็บใน dict ที่โตไม่หยุด)
+# key derive ครั้งเดียวและไม่ rotate: ถ้า rotate คำถามจะเปลี่ยนกลาง session
+_question_mac = None
+
+def _question_index(gate: str) -> int:
+    global _question_mac
+    if _question_mac is None:
+        _question_mac = hmac.new(derive_key("stage2-question", 0), digestmod=hashlib.sha256)
+    h = _question_mac.copy()
+    h.update(gate.encode("utf-8"))
+    return int.from_bytes(h.digest()[:8], "big") % len(STAGE2_PIN_QUESTIONS)
 
 def get_question_for_session():
-    """Get or create question for current session"""
-    # Use gate cookie as session identifier
-    gate = request.cookies.get("s2gate", "")
-    if not gate:
-        return get_random_question()
-    
-    # Check if we already have a question for this session
-    if gate not in ACTIVE_QUESTIONS:
-        question = get_random_question()
-        ACTIVE_QUESTIONS[gate] = question
-    
-    return ACTIVE_QUESTIONS[gate]
+    """Question for the current s2gate token (stable for the token's lifetime)"""
+    return STAGE2_PIN_QUESTIONS[_question_index(request.cookies.get("s2gate", ""))]
 
 def verify_pin(pin: str) -> bool:
     """Verify answer against current session's question"""
@@ -140,70 +117,10 @@ def verify_keystroke(typed_phrase: str, duration_ms: float) -> tuple[bool, str]:
         
     return True, "OK"
 
-# ===== Layer 3: OTP =====
-def current_otp_code(seed: str, window: int = OTP_WINDOW_SECONDS) -> str:
-    t = int(time.time() // window)
-    msg = str(t).encode("utf-8")
-    key = seed.encode("utf-8")
-    digest = hmac.new(key, msg, hashlib.sha256).digest()
-    num = int.from_bytes(digest[-4:], "big") % 1_000_000
-    return f"{num:06d}"
-
-def make_otp_qr_png(seed: str) -> bytes:
-    otp = current_otp_code(seed)
-    qr_data = {
-        "otp": otp,
-        "attrs": {
-            "location": "SUT-F1",
-            "clearance": "SECRET"
-        }
-    }
-    text = json.dumps(qr_data, separators=(",", ":"))
-    img = qrcode.make(text)
-    bio = BytesIO()
-    img.save(bio, format="PNG")
-    return bio.getvalue()
-
 # =========================================================
-# ROUTES
+# PAGE FRAGMENTS (render ครั้งเดียว แล้ว cache ตาม progress state)
 # =========================================================
-
-@stage2_bp.post('/stage2/unlock')
-def unlock():
-    password = request.form.get("password", "").strip()
-
-    if password != STAGE2_PASSWORD_PLAINTEXT:
-        return render_page(
-            "Stage 2 — Locked",
-            """
-            <div class="grid">
-              <div class="card">
-                <h1>⛔ Unlock Failed</h1>
-                <p class="muted">Password ไม่ถูกต้อง (ต้องเป็นตัวที่ถอดจาก Stage 1)</p>
-                <div class="row">
-                  <a class="btn secondary" href="/stage1">Back to Stage 1</a>
-                  <a class="btn" href="/stage2">Try again</a>
-                </div>
-              </div>
-            </div>
-            """,
-            subtitle="Stage 2 Gate • Password Required"
-        ), 403
-
-    token = sign_stage2_gate()
-    resp = make_response("", 302)
-    resp.headers["Location"] = "/stage2"
-    resp.set_cookie("s2gate", token, httponly=True, samesite="Lax")
-    return resp
-
-@stage2_bp.get('/stage2')
-def index():
-    # ... (Gate check) ...
-    if not has_stage2_gate():
-        # ... (Locked gate UI) ...
-        # (This part is inside index function but simplified in replacement due to context limit, 
-        #  Use existing gate check logic logic)
-        body = """
+LOCKED_GATE_PAGE = render_page("Stage 2 — Locked", """
         <div class="grid">
           <div class="card">
             <h1>🚧 Stage 2 — Locked Gate</h1>
@@ -223,39 +140,84 @@ def index():
             <small class="muted">เมื่อ Unlock สำเร็จ จะได้ cookie <span class="kbd">s2gate</span></small>
           </div>
         </div>
-        """
-        return render_page("Stage 2 — Locked", body, subtitle="3-Layer MFA • Stage 1 Password Required"), 401
+        """, subtitle="3-Layer MFA • Stage 1 Password Required")
 
-    # ✅ Check progress
-    progress = get_progress()
-    
-    body = f"""
+UNLOCK_FAILED_PAGE = render_page(
+    "Stage 2 — Locked",
+    """
+        <div class="grid">
+          <div class="card">
+            <h1>⛔ Unlock Failed</h1>
+            <p class="muted">Password ไม่ถูกต้อง (ต้องเป็นตัวที่ถอดจาก Stage 1)</p>
+            <div class="row">
+              <a class="btn secondary" href="/stage1">Back to Stage 1</a>
+              <a class="btn" href="/stage2">Try again</a>
+            </div>
+          </div>
+        </div>
+    """,
+    subtitle="Stage 2 Gate • Password Required"
+)
+
+PIN_FAILED_PAGE = render_page(
+    "Layer 2 Failed",
+    """
+        <div class="grid">
+          <div class="card">
+            <h1>❌ Answer Incorrect</h1>
+            <p class="muted">ลองใหม่อีกครั้ง</p>
+            <a class="btn" href="/stage2">Back</a>
+          </div>
+        </div>
+    """,
+    subtitle="PIN Challenge Failed"
+)
+
+LOGIN_SUCCESS_PAGE = render_page(
+    "Authentication Complete",
+    """
+        <div class="grid">
+          <div class="card">
+            <h1>🎉 4-Layer Authentication Success!</h1>
+            <p class="muted">คุณผ่านทั้ง 4 layers: PIN → Biometric → Location → OTP</p>
+            <hr/>
+            <div class="row">
+              <a class="btn" href="/stage3/ui">Go Stage 3 (Authorization Lab)</a>
+              <a class="btn secondary" href="/stage3">Stage 3 API</a>
+              <a class="btn secondary" href="/">Home</a>
+            </div>
+          </div>
+        </div>
+    """,
+    subtitle="All Layers Completed • Session Established"
+)
+
+def _progress_header(done: frozenset) -> str:
+    return f"""
     <div class="grid">
       <div class="card">
         <h1>🔐 Stage 2 — Multi-Layer Authentication</h1>
         <p class="muted">3-Layer MFA System: PIN → Location → OTP</p>
         <hr/>
         <div class="row">
-          <span class="badge {'neon' if 1 in progress else ''}">{'✅' if 1 in progress else '🔒'} Layer 1: PIN</span>
-          <span class="badge {'neon' if 2 in progress else ''}">{'✅' if 2 in progress else '🔒'} Layer 2: Biometric</span>
-          <span class="badge {'neon' if 3 in progress else ''}">{'✅' if 3 in progress else '🔒'} Layer 3: Location</span>
-          <span class="badge {'neon' if 4 in progress else ''}">{'✅' if 4 in progress else '🔒'} Layer 4: OTP</span>
+          <span class="badge {'neon' if 1 in done else ''}">{'✅' if 1 in done else '🔒'} Layer 1: PIN</span>
+          <span class="badge {'neon' if 2 in done else ''}">{'✅' if 2 in done else '🔒'} Layer 2: Biometric</span>
+          <span class="badge {'neon' if 3 in done else ''}">{'✅' if 3 in done else '🔒'} Layer 3: Location</span>
+          <span class="badge {'neon' if 4 in done else ''}">{'✅' if 4 in done else '🔒'} Layer 4: OTP</span>
         </div>
       </div>
 
 """
 
-    # Layer 1: PIN Challenge
-    if 1 not in progress:
-        question = get_question_for_session()
-        body += f"""
+def _pin_card(question: str, hint: str) -> str:
+    return f"""
       <div class="card">
         <h2>🧩 Layer 1 — PIN Challenge</h2>
         <p class="muted">Find the secret PIN to continue.</p>
         <div class="alert">
           <strong>❓ Challenge:</strong>
-          <p>{question['question']}</p>
-          <small class="muted">{question['hint']}</small>
+          <p>{question}</p>
+          <small class="muted">{hint}</small>
         </div>
         <form method="post" action="/stage2/layer2">
           <label>Answer (ตัวเลขเท่านั้น)</label>
@@ -264,9 +226,9 @@ def index():
         </form>
       </div>
 """
-    # Layer 2: Biometric Verification
-    elif 2 not in progress:
-        body += f"""
+
+# Layer 2: Biometric Verification
+_BIO_CARD = f"""
       <div class="card">
         <h2>👤 Layer 2 — Behavioral Biometrics</h2>
         <p class="muted">Keystroke Dynamics Verification</p>
@@ -338,9 +300,9 @@ def index():
         
       </div>
 """
-    # Layer 3: Location Verification
-    elif 3 not in progress:
-        body += f"""
+
+# Layer 3: Location Verification
+_LOCATION_CARD = f"""
       <div class="card">
         <h2>📍 Layer 3 — Location Verification</h2>
         <p class="muted">ยืนยันว่าคุณอยู่ในพื้นที่ มหาวิทยาลัยเทคโนโลยีสุรนารี</p>
@@ -401,9 +363,9 @@ def index():
         </script>
       </div>
 """
-    # Layer 4: OTP (Final)
-    elif 4 not in progress:
-        body += """
+
+# Layer 4: OTP (Final)
+_OTP_CARD = """
       <div class="card">
         <h2>⏱️ Layer 4 — Time-based OTP (Final)</h2>
         <p class="muted">ขั้นตอนสุดท้าย: ยืนยันด้วย OTP</p>
@@ -418,7 +380,7 @@ def index():
         <div class="row">
           <div class="half">
             <h3>OTP QR Code</h3>
-            <p><img id="qr-image" src="/stage2/otp.png?t=0" alt="OTP QR" style="width:100%;max-width:320px;border-radius:14px;border:1px solid #00ffd533;"/></p>
+            <p><img id="qr-image" src="/stage2/otp.png" alt="OTP QR" style="width:100%;max-width:320px;border-radius:14px;border:1px solid #00ffd533;"/></p>
             <p class="muted">สแกนเพื่อดู OTP + attributes</p>
           </div>
           <div class="half">
@@ -435,14 +397,18 @@ def index():
       </div>
       
       <script>
-        // OTP Timer and Auto-refresh
+        // OTP Timer: นับถอยหลังฝั่ง client, QR ของ window ใหม่ push มาทาง SSE (/stage2/otp/stream)
         const OTP_WINDOW = 30; // seconds
         let timeLeft = OTP_WINDOW;
         let refreshCount = 0;
+        let windowEndsAt = 0;   // ms (Date.now()) ตาม event ล่าสุดจาก server
+        let streaming = false;
         
         function updateCountdown() {
           const now = Math.floor(Date.now() / 1000);
-          timeLeft = OTP_WINDOW - (now % OTP_WINDOW);
+          timeLeft = windowEndsAt
+            ? Math.max(0, Math.ceil((windowEndsAt - Date.now()) / 1000))
+            : OTP_WINDOW - (now % OTP_WINDOW);
           
           const countdownEl = document.getElementById('countdown');
           const statusEl = document.getElementById('timer-status');
@@ -465,28 +431,46 @@ def index():
             statusEl.style.color = '';
           }
           
-          // Refresh QR when time resets (new window)
-          if (timeLeft === OTP_WINDOW) {
+          // Fallback (ไม่มี SSE): refresh QR เองเมื่อขึ้น window ใหม่
+          if (!streaming && timeLeft === OTP_WINDOW) {
             refreshQR();
           }
         }
         
         function refreshQR() {
           const qrImage = document.getElementById('qr-image');
-          const timestamp = Date.now();
-          qrImage.src = '/stage2/otp.png?t=' + timestamp;
+          // URL เดียวกันต่อ window -> browser cache ได้ตาม max-age
+          const windowIndex = Math.floor(Date.now() / 1000 / OTP_WINDOW);
+          qrImage.src = '/stage2/otp.png?w=' + windowIndex;
           refreshCount++;
           console.log('QR refreshed:', refreshCount);
         }
         
-        // Update every second
+        function startStream() {
+          if (!window.EventSource) return;
+          const es = new EventSource('/stage2/otp/stream');
+          es.addEventListener('otp-window', (e) => {
+            const d = JSON.parse(e.data);
+            streaming = true;
+            windowEndsAt = Date.now() + d.remaining * 1000;
+            document.getElementById('qr-image').src = d.qr;
+            refreshCount++;
+            updateCountdown();
+          });
+          // stream ปิดเองทุก ๆ ไม่กี่ window -> EventSource ต่อใหม่ (Last-Event-ID) ระหว่างนั้นใช้ fallback
+          es.onopen = () => { streaming = true; };
+          es.onerror = () => { streaming = false; windowEndsAt = 0; };
+        }
+        
+        // Update every second (แสดงผลอย่างเดียว ไม่ยิง request)
         setInterval(updateCountdown, 1000);
         updateCountdown(); // Initial call
+        startStream();
       </script>
 """
-    else:
-        # All layers completed!
-        body += """
+
+# All layers completed!
+_ALL_DONE_CARD = """
       <div class="card">
         <h1>✅ All Layers Completed!</h1>
         <p class="muted">คุณผ่านทุกขั้นตอนของ 4-Layer MFA แล้ว</p>
@@ -497,10 +481,68 @@ def index():
       </div>
 """
 
-    body += """
+_LAYER_CARDS = {2: _BIO_CARD, 3: _LOCATION_CARD, 4: _OTP_CARD, None: _ALL_DONE_CARD}
+
+def next_layer(done: frozenset):
+    """First layer (1-4) not yet completed, or None when all layers are done."""
+    for layer in (1, 2, 3, 4):
+        if layer not in done:
+            return layer
+    return None
+
+@lru_cache(maxsize=64)
+def render_stage2_index(done: frozenset, question: str = "", hint: str = "") -> bytes:
+    """Full /stage2 page for one progress state (question/hint only matter on Layer 1)."""
+    layer = next_layer(done)
+    card = _pin_card(question, hint) if layer == 1 else _LAYER_CARDS[layer]
+    body = _progress_header(done) + card + """
     </div>
     """
-    resp = make_response(render_page("Stage 2 — 4-Layer MFA", body, subtitle="Advanced Authentication System"))
+    return render_page("Stage 2 — 4-Layer MFA", body, subtitle="Advanced Authentication System")
+
+def preload_pages():
+    """Render the normal in-order progress states and load qrcode (pre-fork)."""
+    for q in STAGE2_PIN_QUESTIONS:
+        render_stage2_index(frozenset(), q["question"], q["hint"])
+    for n in range(1, 5):
+        render_stage2_index(frozenset(range(1, n + 1)))
+    import qrcode  # noqa: F401  (ให้ worker ไม่ต้อง import เองตอน render QR ครั้งแรก)
+
+# =========================================================
+# ROUTES
+# =========================================================
+
+@stage2_bp.post('/stage2/unlock')
+def unlock():
+    password = request.form.get("password", "").strip()
+
+    if password != STAGE2_PASSWORD_PLAINTEXT:
+        record("stage2.unlock", ok=False)
+        FUNNEL.hit("stage1.unlock", False)
+        return UNLOCK_FAILED_PAGE, 403
+
+    token = sign_stage2_gate()
+    record("stage2.unlock", ok=True, player=player_id(token))
+    FUNNEL.hit("stage1.unlock", True)
+    resp = make_response("", 302)
+    resp.headers["Location"] = "/stage2"
+    resp.set_cookie("s2gate", token, httponly=True, samesite="Lax")
+    return resp
+
+@stage2_bp.get('/stage2')
+def index():
+    if not has_stage2_gate():
+        return LOCKED_GATE_PAGE, 401
+
+    # ✅ Check progress
+    done = frozenset(get_progress())
+    if 1 not in done:
+        question = get_question_for_session()
+        page = render_stage2_index(done, question["question"], question["hint"])
+    else:
+        page = render_stage2_index(done)
+
+    resp = make_response(page)
     # Fix UnicodeEncodeError: Headers must be latin-1. URL encode the value if it has special chars.
     resp.headers["X-SUT-Magic"] = quote(STAGE2_MAGIC_NUMBER)
     return resp
@@ -514,19 +556,11 @@ def layer2_pin():
     
     pin = request.form.get("pin", "")
     if not verify_pin(pin):
-        return render_page(
-            "Layer 2 Failed",
-            """
-            <div class="grid">
-              <div class="card">
-                <h1>❌ Answer Incorrect</h1>
-                <p class="muted">ลองใหม่อีกครั้ง</p>
-                <a class="btn" href="/stage2">Back</a>
-              </div>
-            </div>
-            """,
-            subtitle="PIN Challenge Failed"
-        ), 403
+        record("stage2.pin", ok=False)
+        FUNNEL.hit("stage2.pin", False)
+        return PIN_FAILED_PAGE, 403
+    record("stage2.pin", ok=True)
+    FUNNEL.hit("stage2.pin", True)
     
     progress = get_progress()
     if 1 not in progress:
@@ -556,6 +590,8 @@ def layer_bio():
     is_valid, msg = verify_keystroke(phrase, duration)
 
     if not is_valid:
+        record("stage2.bio", ok=False, reason=msg, duration_ms=duration)
+        FUNNEL.hit("stage2.bio", False)
         return render_page(
             "Layer 2 Failed",
             f"""
@@ -575,6 +611,8 @@ def layer_bio():
             subtitle="Behavioral Biometrics Failed"
         ), 403
 
+    record("stage2.bio", ok=True, duration_ms=duration)
+    FUNNEL.hit("stage2.bio", True)
     if 2 not in progress:
         progress.append(2)
     resp = make_response("", 302)
@@ -607,6 +645,8 @@ def layer3_location():
     is_valid, dist = verify_location(lat, lon)
     
     if not is_valid:
+        record("stage2.location", ok=False, distance_km=round(dist, 2))
+        FUNNEL.hit("stage2.location", False)
         return render_page(
             "Layer 2 Failed",
             f"""
@@ -626,6 +666,8 @@ def layer3_location():
             subtitle="Location Verification Failed"
         ), 403
     
+    record("stage2.location", ok=True, distance_km=round(dist, 2))
+    FUNNEL.hit("stage2.location", True)
     if 3 not in progress:
         progress.append(3)
     resp = make_response("", 302)
@@ -638,9 +680,43 @@ def otp_png():
     if not has_stage2_gate():
         return "Stage 2 is locked. Unlock with Stage 1 password first.", 401
 
-    seed = "server-room-sut-2026"
-    png = make_otp_qr_png(seed)
-    return send_file(BytesIO(png), mimetype="image/png")
+    # เลือก format จาก Accept: SVG เฉพาะ client ที่ให้ q ของ SVG สูงกว่า PNG
+    # (browser ทั่วไปรับทั้งคู่เท่ากัน -> PNG 1-bit ซึ่งเล็กกว่า)
+    accept = request.accept_mimetypes
+    fmt = "svg" if accept.quality(QR_MIMETYPES["svg"]) > accept.quality(QR_MIMETYPES["png"]) else "png"
+
+    QR_CACHE.ensure_prerender()
+    now = time.time()
+    t = otp_window(now)
+    img = QR_CACHE.cached(t, fmt)
+    if img is None:
+        # cache miss (เช่น thread pre-render ยังไม่ทัน) -> render บน CPU pool แทน request thread
+        img = CPU_POOL.run("stage2.otp_png", QR_CACHE.get, t, fmt)
+    resp = Response(img, mimetype=QR_MIMETYPES[fmt])
+    resp.vary.add("Accept")
+    # รูปเปลี่ยนตอนจบ window เท่านั้น
+    resp.headers["Cache-Control"] = f"private, max-age={seconds_left_in_window(now)}"
+    return resp
+
+@stage2_bp.get('/stage2/otp/stream')
+def otp_stream():
+    verified = GATE_TOKENS.verify(request.cookies.get("s2gate", ""))
+    if verified is None:
+        return "Stage 2 is locked. Unlock with Stage 1 password first.", 401
+    if not OTP_STREAM_ENABLED:
+        return "", 204  # EventSource หยุดต่อใหม่ -> หน้าเว็บ poll QR เอง
+
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", "-1"))
+    except ValueError:
+        last_event_id = -1
+
+    QR_CACHE.ensure_prerender()
+    gate_exp = verified[0]
+    resp = Response(QR_CACHE.stream(until=gate_exp, last_event_id=last_event_id), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # กัน reverse proxy buffer event
+    return resp
 
 @stage2_bp.post('/stage2/login')
 def login():
@@ -655,11 +731,14 @@ def login():
     otp = request.form.get("otp", "").strip()
 
     if username not in USERS:
+        record("stage2.login", ok=False, reason="unknown_user")
+        FUNNEL.hit("stage2.otp", False)
         return "Unknown user.", 400
 
-    seed = "server-room-sut-2026"
-    expected = current_otp_code(seed)
+    expected = current_otp_code(STAGE2_OTP_SEED)
     if otp != expected:
+        record("stage2.login", ok=False, reason="otp_mismatch", username=username)
+        FUNNEL.hit("stage2.otp", False)
         return f"OTP invalid. (Expected: {expected} for debugging)", 403
 
     # ✅ All layers completed!
@@ -667,24 +746,9 @@ def login():
         progress.append(4)
     
     sid = new_session(username)
-    resp = make_response(render_page(
-        "Authentication Complete",
-        """
-        <div class="grid">
-          <div class="card">
-            <h1>🎉 4-Layer Authentication Success!</h1>
-            <p class="muted">คุณผ่านทั้ง 4 layers: PIN → Biometric → Location → OTP</p>
-            <hr/>
-            <div class="row">
-              <a class="btn" href="/stage3/ui">Go Stage 3 (Authorization Lab)</a>
-              <a class="btn secondary" href="/stage3">Stage 3 API</a>
-              <a class="btn secondary" href="/">Home</a>
-            </div>
-          </div>
-        </div>
-        """,
-        subtitle="All Layers Completed • Session Established"
-    ))
+    record("stage2.login", ok=True, username=username)
+    FUNNEL.hit("stage2.otp", True)
+    resp = make_response(LOGIN_SUCCESS_PAGE)
     resp.set_cookie("sid", sid, httponly=True, samesite="Lax")
     set_progress_cookie(resp, progress)
     # Clean gate after login (optional)
@@ -1,21 +1,34 @@
 # stage3/routes.py
 
-import json
 import time
-import hmac
-import hashlib
 import base64
 from typing import Tuple, Optional
+from functools import lru_cache
 from flask import request, jsonify, Blueprint
 from dataclasses import dataclass
 
 from config import (
-    PERMIT_SIGNING_KEY, ACCESS_MATRIX, MLS_LEVEL, ROLES, FLAG
+    FLAG, USERS
 )
-from utils import render_page, b64url_encode, b64url_decode, require_session, is_allowed, clearance_at_least
+from tokens import PERMIT_TOKENS, encode_permit
+from utils import render_page, require_session
+from policy import POLICY
+from audit import record
+from funnel import FUNNEL
 
 from . import stage3_bp
 
+# =========================================================
+# AUTHORIZATION (resolve เป็นตัวเลขครั้งเดียวตอน import -> route เรียก POLICY.decide)
+# flag ต้องมีทั้ง permit ที่ valid และ clearance SECRET ขึ้นไป
+# =========================================================
+PERM_DASHBOARD = POLICY.permission_bit("stage3.dashboard")
+PERM_PERMIT_REQUEST = POLICY.permission_bit("permit.request")
+LABEL_PUBLIC = POLICY.label_level("PUBLIC")
+LABEL_FLAG = POLICY.label_level("SECRET")
+
+FORBIDDEN = {"ok": False, "error": "Forbidden by policy."}
+
 # =========================================================
 # STAGE 3 LOGIC: CIRCUIT DECODER
 # =========================================================
@@ -28,79 +41,60 @@ class Permit:
     exp: int
 
 def sign_permit(p: Permit) -> str:
-    payload = {
-        "sub": p.sub,
-        "action": p.action,
-        "resource": p.resource,
-        "attrs": p.attrs,
-        "exp": p.exp,
-    }
-    body = b64url_encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
-    sig = hmac.new(PERMIT_SIGNING_KEY, body.encode("utf-8"), hashlib.sha256).digest()
-    return f"{body}.{b64url_encode(sig)}"
+    return PERMIT_TOKENS.sign(p.exp, encode_permit(p.sub, p.action, p.resource, p.attrs))
 
 def verify_permit(token: str) -> Optional[dict]:
-    try:
-        body, sig = token.split(".", 1)
-        expected = hmac.new(PERMIT_SIGNING_KEY, body.encode("utf-8"), hashlib.sha256).digest()
-        if not hmac.compare_digest(b64url_decode(sig), expected):
-            return None
-        payload = json.loads(b64url_decode(body).decode("utf-8"))
-        if int(payload.get("exp", 0)) < int(time.time()):
-            return None
-        return payload
-    except Exception:
+    # PERMIT_TOKENS decode + cache payload ให้แล้ว -> copy ก่อนเติม exp (dict ใน cache ใช้ร่วมกันทุก request)
+    verified = PERMIT_TOKENS.verify(token)
+    if verified is None:
         return None
+    exp, payload = verified
+    return {**payload, "exp": exp}
+
+# ผลลัพธ์มีได้แค่ 8 แบบ (breaker ละ ผ่าน/ไม่ผ่าน) -> build ครั้งเดียวตอน import
+# log เป็น tuple ของ str คงที่ ไม่ต้อง append สร้างใหม่ทุก request
+# Hints:
+#   Breaker 1 (RBAC):   TUFJTlRfT1ZFUlJJREU=  => "MAINT_OVERRIDE"   (Octal: 115 101 111 116 124 137 117 126 105 122 122 111 104 105)
+#   Breaker 2 (MLS):    UEhZU0lDQUxfQUNDRVNT  => "PHYSICAL_ACCESS"  (Octal: 120 110 131 123 111 103 101 114 137 101 103 103 105 123 123)
+#   Breaker 3 (Master): Nzc4OA==              => "7788"             (Octal: 067 067 070 070)
+CIRCUIT_CODES = ("MAINT_OVERRIDE", "PHYSICAL_ACCESS", "7788")
+_BREAKER_LOGS = (
+    ("✅ Breaker 1 (RBAC): Bypassed via Maintenance Code.", "❌ Breaker 1 (RBAC): Locked. Invalid Override Code."),
+    ("✅ Breaker 2 (MLS): Bypassed via Physical Access Code.", "❌ Breaker 2 (MLS): Locked. Invalid Access Code."),
+    ("✅ Breaker 3 (Master): PIN Verified.", "❌ Breaker 3 (Master): Locked. Invalid PIN."),
+)
+_UNLOCKED_LOG = "🎉 SYSTEM UNLOCKED: Emergency Permit Generated."
+
+def _build_circuit_status(mask: int) -> dict:
+    passed = [bool(mask & (1 << i)) for i in range(3)]
+    logs = tuple(_BREAKER_LOGS[i][0 if ok else 1] for i, ok in enumerate(passed))
+    all_pass = all(passed)
+    if all_pass:
+        logs += (_UNLOCKED_LOG,)
+    return {"b1": passed[0], "b2": passed[1], "b3": passed[2], "all_pass": all_pass, "logs": logs}
+
+CIRCUIT_OUTCOMES = tuple(_build_circuit_status(mask) for mask in range(8))  # index = bitmask ของ breaker ที่ผ่าน
+CIRCUIT_HITS = [0] * 8
 
 def check_circuit_status(attrs: dict) -> dict:
     """
     ตรวจสอบรหัสปลดล็อกวงจรทีละชั้น (Circuit Breakers)
     ผู้เล่นต้องส่งค่าที่ Decode แล้วมาให้ถูกต้อง
+    คืน dict ที่ precompute ไว้ (ใช้ร่วมกันทุก request ห้ามแก้)
     """
-    status = {
-        "b1": False, # Breaker 1: RBAC Override
-        "b2": False, # Breaker 2: MLS Override
-        "b3": False, # Breaker 3: Master PIN
-        "all_pass": False,
-        "logs": []
-    }
-    
-    # --- BREAKER 1: RBAC OVERRIDE ---
-    # Hint: TUFJTlRfT1ZFUlJJREU=  => Decode ได้ "MAINT_OVERRIDE"
-    # Octal: 115 101 111 116 124 137 117 126 105 122 122 111 104 105
-    code1 = attrs.get("code_1", "").strip()
-    if code1 == "MAINT_OVERRIDE":
-        status["b1"] = True
-        status["logs"].append("✅ Breaker 1 (RBAC): Bypassed via Maintenance Code.")
-    else:
-        status["logs"].append("❌ Breaker 1 (RBAC): Locked. Invalid Override Code.")
-
-    # --- BREAKER 2: MLS OVERRIDE ---
-    # Hint: UEhZU0lDQUxfQUNDRVNT => Decode ได้ "PHYSICAL_ACCESS"
-    # Octal: 120 110 131 123 111 103 101 114 137 101 103 103 105 123 123
-    code2 = attrs.get("code_2", "").strip()
-    if code2 == "PHYSICAL_ACCESS":
-        status["b2"] = True
-        status["logs"].append("✅ Breaker 2 (MLS): Bypassed via Physical Access Code.")
-    else:
-        status["logs"].append("❌ Breaker 2 (MLS): Locked. Invalid Access Code.")
-
-    # --- BREAKER 3: MASTER SWITCH ---
-    # Hint: Nzc4OA== => Decode ได้ "7788"
-    # Octal: 067 067 070 070
-    code3 = attrs.get("code_3", "").strip()
-    if code3 == "7788":
-        status["b3"] = True
-        status["logs"].append("✅ Breaker 3 (Master): PIN Verified.")
-    else:
-        status["logs"].append("❌ Breaker 3 (Master): Locked. Invalid PIN.")
+    mask = 0
+    for i, code in enumerate(CIRCUIT_CODES):
+        value = attrs.get(f"code_{i + 1}", "")
+        if isinstance(value, str) and value.strip() == code:
+            mask |= 1 << i
+    CIRCUIT_HITS[mask] += 1
+    return CIRCUIT_OUTCOMES[mask]
 
-    # FINAL CHECK
-    if status["b1"] and status["b2"] and status["b3"]:
-        status["all_pass"] = True
-        status["logs"].append("🎉 SYSTEM UNLOCKED: Emergency Permit Generated.")
-    
-    return status
+def circuit_stats() -> dict:
+    return {
+        "outcomes": len(CIRCUIT_OUTCOMES),
+        "hits": {format(mask, "03b"): n for mask, n in enumerate(CIRCUIT_HITS)},
+    }
 
 # =========================================================
 # ROUTES
@@ -110,6 +104,8 @@ def check_circuit_status(attrs: dict) -> dict:
 def index():
     sess, err = require_session()
     if err: return err[0], err[1]
+    if not POLICY.decide(sess, PERM_DASHBOARD, LABEL_PUBLIC):
+        return jsonify(FORBIDDEN), 403
     
     return jsonify({
         "ok": True,
@@ -120,14 +116,12 @@ def index():
         }
     })
 
-@stage3_bp.get('/stage3/ui')
-def ui():
-    sess, err = require_session()
-    if err:
-        return render_page("Stage 3", "<h1>Not logged in</h1>", "Error"), 401
+NOT_LOGGED_IN_PAGE = render_page("Stage 3", "<h1>Not logged in</h1>", "Error")
+FORBIDDEN_PAGE = render_page("Stage 3", "<h1>Forbidden</h1>", "Error")
 
-    role = sess["role"]
-    
+@lru_cache(maxsize=16)
+def render_stage3_ui(role: str, clearance: str) -> bytes:
+    """Stage 3 UI only varies by role/clearance badge -> render once per pair."""
     script_content = """
     <script>
     function testCircuit() {
@@ -231,7 +225,7 @@ def ui():
         <h1>⚡ Stage 3: Security Circuit Decoder</h1>
         <div class="row">
           <span class="badge neon">Role: {role}</span>
-          <span class="badge pink">Clearance: {sess.get("clearance")}</span>
+          <span class="badge pink">Clearance: {clearance}</span>
         </div>
         <p class="muted">
            <b>Objective:</b> The security system has 3 layers. You must <b>DECODE</b> the bypass signal for each layer
@@ -321,16 +315,36 @@ def ui():
     """
     return render_page("Stage 3 - Circuit Decoder", body, "Authorization & Encoding Puzzle")
 
+def preload_pages():
+    """Render the UI for every role/clearance in USERS (pre-fork: workers inherit the cache)."""
+    for user in USERS.values():
+        render_stage3_ui(user["role"], user.get("clearance"))
+
+@stage3_bp.get('/stage3/ui')
+def ui():
+    sess, err = require_session()
+    if err:
+        return NOT_LOGGED_IN_PAGE, 401
+    if not POLICY.decide(sess, PERM_DASHBOARD, LABEL_PUBLIC):
+        return FORBIDDEN_PAGE, 403
+
+    return render_stage3_ui(sess["role"], sess.get("clearance"))
+
 @stage3_bp.post('/stage3/request-permit')
 def request_permit():
     sess, err = require_session()
     if err: return err[0], err[1]
+    if not POLICY.decide(sess, PERM_PERMIT_REQUEST, LABEL_PUBLIC):
+        return jsonify(FORBIDDEN), 403
 
     data = request.get_json(silent=True) or {}
     attrs = data.get("attrs") or {}
 
     # ตรวจสอบ Logic ทั้ง 3 ชั้น
     status = check_circuit_status(attrs)
+    breakers = "".join("1" if status[b] else "0" for b in ("b1", "b2", "b3"))
+    record("stage3.permit", ok=status["all_pass"], sub=sess["sub"], breakers=breakers)
+    FUNNEL.hit("stage3.permit", status["all_pass"])
     
     if status["all_pass"]:
         # ถ้าผ่านหมด ให้ Permit
@@ -363,9 +377,14 @@ def get_flag():
     if err: return err[0], err[1]
     
     permit = request.headers.get("X-Permit", "").strip()
-    if not permit: return jsonify({"ok": False, "error": "Missing Token"}), 403
-    
-    payload = verify_permit(permit)
-    if not payload: return jsonify({"ok": False, "error": "Invalid Token"}), 403
+    payload = verify_permit(permit) if permit else None
+    if not payload:
+        FUNNEL.hit("stage3.flag", False)
+        if not permit: return jsonify({"ok": False, "error": "Missing Token"}), 403
+        return jsonify({"ok": False, "error": "Invalid Token"}), 403
+    if not POLICY.decide(sess, PERM_DASHBOARD, LABEL_FLAG):
+        FUNNEL.hit("stage3.flag", False)
+        return jsonify(FORBIDDEN), 403
+    FUNNEL.hit("stage3.flag", True)
 
     return jsonify({"ok": True, "flag": FLAG, "by": "Circuit Decoder (ABAC+Rule)"}), 200
\ No newline at end of file
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# =========================================================
+# STARTUP PROFILE
+# จับเวลาแต่ละช่วงตอน boot (import blueprint, build หน้า, load key ...)
+# ดูผลได้จาก report() / GET /ops/startup
+# =========================================================
+BOOT_STARTED = time.perf_counter()
+
+_PHASES = []  # [(phase, seconds)] ตามลำดับที่รัน
+_booted_at = None
+
+@contextmanager
+def timed(phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _PHASES.append((phase, time.perf_counter() - started))
+
+def mark_booted():
+    """Call once the app is ready to serve; fixes the total boot time."""
+    global _booted_at
+    _booted_at = time.perf_counter()
+
+def snapshot() -> dict:
+    end = _booted_at if _booted_at is not None else time.perf_counter()
+    return {
+        "pid": os.getpid(),
+        "boot_ms": round((end - BOOT_STARTED) * 1000, 3),
+        "phases": [{"phase": name, "ms": round(secs * 1000, 3)} for name, secs in _PHASES],
+    }
+
+def report(stream=sys.stderr):
+    snap = snapshot()
+    print(f"[startup] pid {snap['pid']} booted in {snap['boot_ms']:.1f} ms", file=stream)
+    for row in snap["phases"]:
+        print(f"[startup]   {row['phase']:<28}{row['ms']:>10.1f} ms", file=stream)
+
+# =========================================================
+# IMPORT-TIME PROFILE (python app.py --startup-profile)
+# รัน process ใหม่ด้วย `python -X importtime` แล้วสรุปว่า module ไหนกินเวลา boot
+# =========================================================
+_PROFILE_SNIPPET = "import sys, app, startup; app.create_app(); startup.report(sys.stdout)"
+
+def parse_importtime(stderr: str) -> list:
+    """[(module, self_us, cumulative_us)] from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header row
+        rows.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return rows
+
+def importtime_profile(top: int = 25, stream=sys.stdout) -> int:
+    import subprocess
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROFILE_SNIPPET],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        print(proc.stderr, file=sys.stderr)
+        return proc.returncode
+    rows = parse_importtime(proc.stderr)
+    total_us = sum(self_us for _, self_us, _ in rows)
+    print(f"{len(rows)} modules imported, {total_us / 1000:.1f} ms total import time", file=stream)
+    print(f"\n{'module':<48}{'self ms':>10}{'cumul ms':>10}", file=stream)
+    for name, self_us, cumul_us in sorted(rows, key=lambda r: r[2], reverse=True)[:top]:
+        print(f"{name:<48}{self_us / 1000:>10.1f}{cumul_us / 1000:>10.1f}", file=stream)
+    print(file=stream)
+    stream.write(proc.stdout)
+    return 0
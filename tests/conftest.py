@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# ต้องตั้งก่อน config.py ถูก import: ไม่เขียน audit log / sessions.db ลง repo ตอนรันเทสต์
+os.environ.setdefault("CTF_AUDIT", "0")
+os.environ.setdefault("CTF_SESSION_BACKEND", "memory")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NOW = 1_800_000_000
+
+class Clock:
+    """Injectable clock= for stores / codecs: tests move time by setting .now."""
+
+    def __init__(self, now: float = NOW):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock():
+    return Clock()
@@ -0,0 +1,56 @@
+import gzip
+
+import pytest
+
+import assets
+import compression
+from app import create_app
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+@pytest.fixture(scope="module")
+def client():
+    return create_app().test_client()
+
+def test_asset_gzip_then_304(client):
+    url = assets.asset_url(assets.THEME_CSS_ASSET)
+    resp = client.get(url, headers=GZIP)
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert gzip.decompress(resp.data) == assets.THEME_CSS_ASSET.body
+
+    etag = resp.headers["ETag"]
+    assert etag.startswith("W/")  # บีบแล้ว = representation อื่น
+    again = client.get(url, headers={**GZIP, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+
+def test_page_gzip_then_304(client):
+    plain = client.get("/stage1")
+    resp = client.get("/stage1", headers=GZIP)
+    assert gzip.decompress(resp.data) == plain.data
+    again = client.get("/stage1", headers={**GZIP, "If-None-Match": resp.headers["ETag"]})
+    assert again.status_code == 304
+
+def test_identity_when_not_accepted(client):
+    resp = client.get("/stage1", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in resp.headers
+    assert resp.headers["ETag"].startswith('"')
+
+def test_home_cached_and_304(client):
+    resp = client.get("/", headers=GZIP)
+    assert resp.headers["Content-Encoding"] == "gzip"
+    before = len(compression._VARIANTS)
+    again = client.get("/", headers=GZIP)
+    assert again.data == resp.data
+    assert len(compression._VARIANTS) == before  # ใช้ variant เดิม ไม่บีบใหม่
+    assert client.get("/", headers={**GZIP, "If-None-Match": resp.headers["ETag"]}).status_code == 304
+
+def test_dynamic_body_not_cached(client):
+    before = len(compression._VARIANTS)
+    # หน้า error ของ POST -> บีบสด ไม่เก็บใน cache
+    resp = client.post("/stage2/unlock", data={"password": "wrong"}, headers=GZIP)
+    assert resp.status_code == 403
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert len(compression._VARIANTS) == before
@@ -0,0 +1,23 @@
+import pytest
+
+from app import create_app
+from ops import routes as ops_routes
+
+TOKEN = "test-ops-token"
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(ops_routes, "OPS_TOKEN", TOKEN)
+    monkeypatch.setattr(ops_routes, "TRACE_ENABLED", True)
+    return create_app().test_client()
+
+@pytest.mark.parametrize("path", ["/debug/traces", "/metrics", "/ops/funnel", "/ops/pool"])
+def test_requires_token(client, path):
+    assert client.get(path).status_code in (403, 404)
+    assert client.get(path, headers={"X-Ops-Token": "wrong"}).status_code in (403, 404)
+    assert client.get(path, headers={"X-Ops-Token": "ผิด"}).status_code in (403, 404)
+    assert client.get(path, headers={"Authorization": f"Bearer {TOKEN}"}).status_code == 200
+
+def test_disabled_without_configured_token(client, monkeypatch):
+    monkeypatch.setattr(ops_routes, "OPS_TOKEN", "")
+    assert client.get("/ops/pool", headers={"X-Ops-Token": ""}).status_code == 404
@@ -0,0 +1,31 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from stage2.otp import qr_matrix, otp_qr_text, render_qr_png, render_qr_svg
+
+@pytest.fixture(scope="module")
+def matrix():
+    return qr_matrix(otp_qr_text("server-room-sut-2026", t=1))
+
+def expected_pixel(matrix, x: int, y: int, box: int, border: int) -> bool:
+    """True = dark, from the module grid (quiet zone included)."""
+    mx, my = x // box - border, y // box - border
+    return 0 <= my < len(matrix) and 0 <= mx < len(matrix) and matrix[my][mx]
+
+@pytest.mark.parametrize("box, border", [(10, 4), (3, 2), (1, 0)])  # box 3: แถวไม่ลงตัวที่ 8 bit
+def test_png_matches_matrix(matrix, box, border):
+    img = Image.open(BytesIO(render_qr_png(matrix, box=box, border=border)))
+    img.load()
+    assert img.format == "PNG" and img.mode == "P"
+    size = (len(matrix) + 2 * border) * box
+    assert img.size == (size, size)
+    pixels = img.convert("L").load()
+    for y in range(size):
+        for x in range(size):
+            assert (pixels[x, y] == 0) == expected_pixel(matrix, x, y, box, border), (x, y)
+
+def test_svg_is_one_path(matrix):
+    svg = render_qr_svg(matrix).decode("utf-8")
+    assert svg.startswith("<svg") and svg.count("<path") == 1
@@ -0,0 +1,86 @@
+import pytest
+
+from sessions import MemorySessionStore, SQLiteSessionStore
+
+NOW = 1_800_000_000.0
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, clock, tmp_path):
+    def make(**kwargs):
+        if request.param == "sqlite":
+            # sweep / touch ทุกครั้ง และไม่ใช้ read cache -> เห็นผลของ DB ตรง ๆ
+            return SQLiteSessionStore(str(tmp_path / "sessions.db"), clock=clock, sweep_interval=0,
+                                      cache_seconds=0, touch_every=0, **kwargs)
+        return MemorySessionStore(clock=clock, **kwargs)
+    return make
+
+def record(user: str = "fame") -> dict:
+    return {"user": user, "role": "student", "ts": NOW}
+
+def test_put_get_delete(make_store):
+    store = make_store()
+    store.put("s1", record())
+    assert store.get("s1")["user"] == "fame"
+    store.delete("s1")
+    assert store.get("s1") is None
+    assert store.get("missing") is None
+
+def test_idle_expiry(make_store, clock):
+    store = make_store(ttl=3600, idle=60)
+    store.put("s1", record())
+    clock.now += 30
+    assert store.get("s1") is not None  # ใช้งาน -> นับ idle ใหม่
+    clock.now += 59
+    assert store.get("s1") is not None
+    clock.now += 61
+    assert store.get("s1") is None
+
+def test_absolute_ttl_even_when_active(make_store, clock):
+    store = make_store(ttl=100, idle=60)
+    store.put("s1", record())
+    for _ in range(3):
+        clock.now += 40
+        store.get("s1")
+    assert clock.now - NOW > 100
+    assert store.get("s1") is None
+
+def test_lru_cap_keeps_recently_used(make_store, clock):
+    store = make_store(max_sessions=2)
+    store.put("a", record("a"))
+    clock.now += 1
+    store.put("b", record("b"))
+    clock.now += 1
+    store.get("a")              # a ใช้ล่าสุด -> b เก่าสุด
+    clock.now += 1
+    store.put("c", record("c"))
+    clock.now += 1
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+
+def test_sqlite_shared_between_stores(clock, tmp_path):
+    # สอง store ไฟล์เดียวกัน = สอง worker
+    path = str(tmp_path / "sessions.db")
+    a = SQLiteSessionStore(path, clock=clock, cache_seconds=0)
+    b = SQLiteSessionStore(path, clock=clock, cache_seconds=0)
+    a.put("s1", record())
+    assert b.get("s1") == record()
+    b.delete("s1")
+    clock.now += 1  # เกินช่วง read cache ของ a แล้ว
+    assert a.get("s1") is None
+
+def test_memory_expiry_heap_bounded(clock):
+    store = MemorySessionStore(clock=clock, max_sessions=10)
+    for i in range(1000):
+        store.put(f"s{i}", record())
+        if i % 2:
+            store.delete(f"s{i}")
+    assert len(store._data) <= 10
+    assert len(store._expiry) <= 2 * 10
+
+def test_memory_reput_not_expired_by_old_heap_entry(clock):
+    store = MemorySessionStore(clock=clock, ttl=100, idle=1000)
+    store.put("s1", record())
+    clock.now += 50
+    store.put("s1", {**record(), "ts": clock.now})  # login ใหม่ sid เดิม -> exp ใหม่
+    clock.now += 60
+    assert store.get("s1") is not None
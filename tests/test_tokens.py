@@ -0,0 +1,82 @@
+import pytest
+
+from keys import KeyRing
+from utils import b64url_encode, b64url_decode
+from tokens import (
+    TokenCodec, VerifiedTokenCache, TOKEN_GATE, TOKEN_PROGRESS, TOKEN_PERMIT,
+    encode_layers, decode_layers, encode_permit, decode_permit,
+)
+
+NOW = 1_800_000_000
+
+def make_codec(token_type: int, clock, purpose: str = "test", **kwargs) -> TokenCodec:
+    return TokenCodec(token_type, KeyRing(purpose, clock=clock), clock=clock, **kwargs)
+
+def flip(token: str, index: int) -> str:
+    raw = bytearray(b64url_decode(token))
+    raw[index] ^= 0x01
+    return b64url_encode(bytes(raw))
+
+def test_round_trip(clock):
+    codec = make_codec(TOKEN_PROGRESS, clock)
+    token = codec.sign(NOW + 60, encode_layers([1, 3, 4]))
+    exp, payload = codec.verify(token)
+    assert exp == NOW + 60
+    assert decode_layers(payload) == [1, 3, 4]
+
+def test_permit_round_trip(clock):
+    attrs = {"code_1": "MAINT_OVERRIDE", "note": "ทดสอบ"}
+    payload = encode_permit("fame", "read", "flag", attrs)
+    assert decode_permit(payload) == {"sub": "fame", "action": "read", "resource": "flag", "attrs": attrs}
+
+@pytest.mark.parametrize("index", [0, 1, 5, 10, -1])  # version, type, kid, payload, tag
+def test_tampered_token_rejected(clock, index):
+    codec = make_codec(TOKEN_PROGRESS, clock)
+    token = codec.sign(NOW + 60, encode_layers([1, 2]))
+    assert codec.verify(flip(token, index)) is None
+
+@pytest.mark.parametrize("token", ["", "!!!", "AAAA", b64url_encode(b"\x01" * 40)])
+def test_garbage_rejected(clock, token):
+    assert make_codec(TOKEN_GATE, clock).verify(token) is None
+
+def test_other_type_rejected(clock):
+    gate = make_codec(TOKEN_GATE, clock)
+    progress = make_codec(TOKEN_PROGRESS, clock)
+    assert progress.verify(gate.sign(NOW + 60)) is None
+
+def test_other_key_rejected(clock):
+    token = make_codec(TOKEN_GATE, clock, purpose="a").sign(NOW + 60)
+    assert make_codec(TOKEN_GATE, clock, purpose="b").verify(token) is None
+
+def test_expired_rejected_even_when_cached(clock):
+    codec = make_codec(TOKEN_GATE, clock)
+    token = codec.sign(NOW + 60)
+    assert codec.verify(token) is not None
+    clock.now = NOW + 61
+    assert codec.verify(token) is None
+
+def test_cache_full_drops_oldest():
+    cache = VerifiedTokenCache(max_entries=3)
+    for i in range(5):
+        cache.put(f"t{i}", (NOW + 60, b""), NOW)
+    assert cache.stats()["size"] == 3
+    assert cache.get("t0", NOW) is None and cache.get("t1", NOW) is None
+    assert cache.get("t4", NOW) == (NOW + 60, b"")
+
+def test_decoded_payload_is_cached(clock):
+    calls = []
+
+    def decode(payload):
+        calls.append(payload)
+        return decode_permit(payload)
+
+    codec = make_codec(TOKEN_PERMIT, clock, decode=decode)
+    token = codec.sign(NOW + 60, encode_permit("fame", "read", "flag", {}))
+    first = codec.verify(token)
+    assert codec.verify(token) is first
+    assert first[1]["sub"] == "fame"
+    assert len(calls) == 1
+
+def test_undecodable_payload_rejected(clock):
+    codec = make_codec(TOKEN_PERMIT, clock, decode=decode_permit)
+    assert codec.verify(codec.sign(NOW + 60, b"\x00")) is None
@@ -0,0 +1,68 @@
+import time
+import threading
+
+import pytest
+from flask import Flask
+
+import workers
+from workers import CPUPool, Overloaded
+
+@pytest.fixture
+def pool():
+    return CPUPool(size=1, max_queue=1, timeout=5)
+
+def fill(pool, release: threading.Event, n: int) -> list:
+    """Occupy n slots with tasks that block until release is set."""
+    def call():
+        pool.run("block", lambda: release.wait(5))
+
+    threads = [threading.Thread(target=call) for _ in range(n)]
+    for t in threads:
+        t.start()
+    wait_pending(pool, lambda pending: pending >= n)
+    return threads
+
+def release_all(release: threading.Event, threads: list, pool):
+    release.set()
+    for t in threads:
+        t.join()
+    # slot คืนใน done callback ซึ่งอาจรันหลัง caller ได้ผลแล้วนิดหนึ่ง
+    wait_pending(pool, lambda pending: pending == 0)
+
+def wait_pending(pool, ok, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not ok(pool.snapshot()["pending"]) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_sheds_when_full(pool):
+    release = threading.Event()
+    threads = fill(pool, release, 2)  # 1 กำลังรัน + 1 รอคิว = เต็ม
+    try:
+        with pytest.raises(Overloaded) as exc:
+            pool.run("block", lambda: None)
+        assert exc.value.endpoint == "block"
+        assert exc.value.retry_after >= 1
+    finally:
+        release_all(release, threads, pool)
+    stats = pool.snapshot()
+    assert stats["pending"] == 0
+    assert stats["endpoints"]["block"]["shed"] == 1
+    assert stats["endpoints"]["block"]["calls"] == 2
+
+def test_accepts_again_after_drain(pool):
+    release = threading.Event()
+    release_all(release, fill(pool, release, 2), pool)
+    assert pool.run("block", lambda: 42) == 42
+
+def test_overloaded_becomes_503():
+    app = Flask(__name__)
+    workers.init_app(app)
+
+    @app.get("/busy")
+    def busy():
+        raise Overloaded("busy", 7)
+
+    resp = app.test_client().get("/busy")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "7"
+    assert resp.json == {"ok": False, "error": "Server busy, retry later.", "endpoint": "busy"}
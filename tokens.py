@@ -0,0 +1,185 @@
+import hmac
+import json
+import time
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from config import TOKEN_CACHE_MAX_ENTRIES
+from keys import KeyRing, GATE_KEYS, PROGRESS_KEYS, PERMIT_KEYS
+from utils import b64url_encode, b64url_decode
+from tracing import traced
+
+# =========================================================
+# TOKEN CODEC (s2gate / s2progress / X-Permit)
+# token = b64url( header | payload | tag )
+#   header  = version(1) type(1) kid(4) exp(4)   big-endian, fixed layout
+#   payload = แล้วแต่ type (binary)
+#   tag     = HMAC-SHA256(key[kid], header | payload) ตัดเหลือ 16 bytes
+# verify: cache ก่อน -> เช็ค version/type/exp/kid จาก header -> HMAC -> ค่อย decode payload
+#   codec ที่มี decode (permit) เก็บผลที่ decode แล้วใน cache -> hit ไม่ต้อง parse ซ้ำ
+# =========================================================
+TOKEN_VERSION = 1
+TOKEN_GATE = 1
+TOKEN_PROGRESS = 2
+TOKEN_PERMIT = 3
+
+_HEADER = struct.Struct(">BBII")
+TAG_SIZE = 16
+
+class VerifiedTokenCache:
+    """
+    token -> (exp, payload) ของ token ที่ verify ผ่านแล้ว
+    hit = dict lookup + เทียบเวลา; entry หมดอายุถูกลบตอนเจอ
+    เต็ม -> ทิ้งตัวที่ใส่ก่อนสุดทีละตัว (O(1)); TTL ต่อ type เท่ากัน ตัวเก่าสุดจึงหมดอายุก่อนด้วย
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str, now: int) -> Optional[Tuple[int, Any]]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] < now:
+            self._entries.pop(token, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, token: str, entry: Tuple[int, Any], now: int):
+        entries = self._entries
+        if len(entries) >= self.max_entries:
+            with self._lock:
+                while entries and len(entries) >= self.max_entries:
+                    entries.popitem(last=False)
+        entries[token] = entry
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "max": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+class TokenCodec:
+    """Sign/verify one token type. Keyed HMAC state is built once per kid and copy()'d per call."""
+
+    def __init__(self, token_type: int, keyring: KeyRing, clock=time.time,
+                 decode: Optional[Callable[[bytes], Any]] = None):
+        self.token_type = token_type
+        self.keyring = keyring
+        self.decode = decode  # payload bytes -> ค่าที่ใช้จริง (None = ไม่ผ่าน); ไม่ตั้ง = คืน bytes
+        self._clock = clock
+        self._macs = {}  # {kid: hmac object already keyed}
+        self._lock = threading.Lock()
+        self.cache = VerifiedTokenCache()
+
+    def _mac(self, kid: int, key: bytes):
+        mac = self._macs.get(kid)
+        if mac is None:
+            mac = hmac.new(key, digestmod=hashlib.sha256)
+            with self._lock:
+                # ring ทิ้ง kid เก่าไปแล้ว -> ทิ้ง state ตาม
+                if len(self._macs) > self.keyring.accept_previous + 1:
+                    self._macs.clear()
+                self._macs[kid] = mac
+        return mac
+
+    def sign(self, exp: int, payload: bytes = b"") -> str:
+        kid, key = self.keyring.current()
+        msg = _HEADER.pack(TOKEN_VERSION, self.token_type, kid, exp) + payload
+        h = self._mac(kid, key).copy()
+        h.update(msg)
+        return b64url_encode(msg + h.digest()[:TAG_SIZE])
+
+    @traced
+    def verify(self, token: str) -> Optional[Tuple[int, Any]]:
+        """(exp, payload) of a valid, unexpired token, else None. payload is decode(bytes) if set, else bytes."""
+        now = int(self._clock())
+        hit = self.cache.get(token, now)
+        if hit is not None:
+            return hit
+        try:
+            raw = b64url_decode(token)
+        except (ValueError, TypeError):
+            return None
+        if len(raw) < _HEADER.size + TAG_SIZE:
+            return None
+        version, token_type, kid, exp = _HEADER.unpack_from(raw)
+        if version != TOKEN_VERSION or token_type != self.token_type or exp < now:
+            return None
+        key = self.keyring.lookup(kid)
+        if key is None:
+            return None
+        msg, tag = raw[:-TAG_SIZE], raw[-TAG_SIZE:]
+        h = self._mac(kid, key).copy()
+        h.update(msg)
+        if not hmac.compare_digest(tag, h.digest()[:TAG_SIZE]):
+            return None
+        payload = msg[_HEADER.size:]
+        if self.decode is not None:
+            payload = self.decode(payload)
+            if payload is None:
+                return None
+        verified = (exp, payload)
+        self.cache.put(token, verified, now)
+        return verified
+
+# =========================================================
+# PAYLOAD LAYOUTS
+# =========================================================
+def encode_layers(layers) -> bytes:
+    """Completed layers (1-7) -> one bitmask byte."""
+    mask = 0
+    for layer in layers:
+        mask |= 1 << layer
+    return bytes((mask,))
+
+def decode_layers(payload: bytes) -> list:
+    if len(payload) != 1:
+        return []
+    mask = payload[0]
+    return [layer for layer in range(1, 8) if mask & (1 << layer)]
+
+_STR_LEN = struct.Struct(">H")
+_BLOB_LEN = struct.Struct(">I")
+
+def _pack_str(s: str) -> bytes:
+    b = s.encode("utf-8")
+    return _STR_LEN.pack(len(b)) + b
+
+def encode_permit(sub: str, action: str, resource: str, attrs: dict) -> bytes:
+    # attrs เป็น dict อิสระที่ผู้เล่นส่งมา -> เก็บเป็น compact JSON blob ท้าย payload
+    blob = json.dumps(attrs, separators=(",", ":")).encode("utf-8")
+    return _pack_str(sub) + _pack_str(action) + _pack_str(resource) + _BLOB_LEN.pack(len(blob)) + blob
+
+def decode_permit(payload: bytes) -> Optional[dict]:
+    try:
+        fields, off = [], 0
+        for _ in range(3):
+            (n,) = _STR_LEN.unpack_from(payload, off)
+            off += _STR_LEN.size
+            fields.append(payload[off:off + n].decode("utf-8"))
+            off += n
+        (n,) = _BLOB_LEN.unpack_from(payload, off)
+        off += _BLOB_LEN.size
+        attrs = json.loads(payload[off:off + n].decode("utf-8"))
+    except (struct.error, ValueError):
+        return None
+    sub, action, resource = fields
+    return {"sub": sub, "action": action, "resource": resource, "attrs": attrs}
+
+GATE_TOKENS = TokenCodec(TOKEN_GATE, GATE_KEYS)
+PROGRESS_TOKENS = TokenCodec(TOKEN_PROGRESS, PROGRESS_KEYS)
+PERMIT_TOKENS = TokenCodec(TOKEN_PERMIT, PERMIT_KEYS, decode=decode_permit)
+
+def preload_keys():
+    """Derive the current keys and keyed HMAC states for every token type (pre-fork)."""
+    for codec in (GATE_TOKENS, PROGRESS_TOKENS, PERMIT_TOKENS):
+        kid, key = codec.keyring.current()
+        codec._mac(kid, key)
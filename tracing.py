@@ -0,0 +1,108 @@
+import os
+import time
+import random
+import threading
+import functools
+from collections import deque
+from flask import request
+
+from config import TRACE_ENABLED, TRACE_SAMPLE_RATE, TRACE_SPANS_PER_REQUEST, TRACE_KEEP
+
+# =========================================================
+# TRACING (opt-in: CTF_TRACE=1)
+# - @traced ครอบ function ใน hot path (verify token, render QR/หน้า ...)
+#   ปิดอยู่ -> decorator คืน function เดิมเลยตอน import (ไม่มี wrapper = ไม่มี overhead)
+# - เปิดอยู่: สุ่มเก็บ TRACE_SAMPLE_RATE ของ request; span ลง ring buffer ของ request นั้น
+#   request ที่ไม่ถูกสุ่ม: wrapper เช็ค thread-local แล้วเรียก function ตรง ๆ
+# - GET /debug/traces -> Chrome trace-event JSON (เปิดใน chrome://tracing หรือ Perfetto)
+# =========================================================
+class RequestTrace:
+    __slots__ = ("seq", "name", "start_ns", "end_ns", "depth", "spans")
+
+    def __init__(self, seq: int, name: str):
+        self.seq = seq
+        self.name = name
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.depth = 0
+        self.spans = deque(maxlen=TRACE_SPANS_PER_REQUEST)  # (name, start_ns, dur_ns, depth)
+
+_local = threading.local()
+_finished = deque(maxlen=TRACE_KEEP)
+_seq_lock = threading.Lock()
+_seq = 0
+
+def traced(fn=None, *, name: str = None):
+    """Record fn as a span of the current (sampled) request. No-op unless CTF_TRACE=1."""
+    if fn is None:
+        return functools.partial(traced, name=name)
+    if not TRACE_ENABLED:
+        return fn
+    span_name = name or fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        trace = getattr(_local, "trace", None)
+        if trace is None:
+            return fn(*args, **kwargs)
+        depth = trace.depth
+        trace.depth = depth + 1
+        started = time.perf_counter_ns()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            trace.spans.append((span_name, started, time.perf_counter_ns() - started, depth))
+            trace.depth = depth
+
+    return wrapper
+
+def propagate(fn):
+    """Wrap fn so it records into the calling request's trace when run on another thread (CPU_POOL)."""
+    if not TRACE_ENABLED:
+        return fn
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return fn
+
+    def run(*args, **kwargs):
+        _local.trace = trace
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.trace = None
+
+    return run
+
+def _before_request():
+    global _seq
+    if random.random() >= TRACE_SAMPLE_RATE:
+        _local.trace = None
+        return
+    with _seq_lock:
+        _seq += 1
+        seq = _seq
+    _local.trace = RequestTrace(seq, f"{request.method} {request.path}")
+
+def _teardown_request(_exc):
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        _local.trace = None
+        trace.end_ns = time.perf_counter_ns()
+        _finished.append(trace)
+
+def chrome_trace() -> dict:
+    """Finished traces as Chrome trace-event JSON (one tid per request, times in µs)."""
+    pid = os.getpid()
+    events = []
+    for trace in list(_finished):
+        events.append({"name": trace.name, "ph": "X", "pid": pid, "tid": trace.seq,
+                       "ts": trace.start_ns / 1000, "dur": (trace.end_ns - trace.start_ns) / 1000})
+        for span_name, start_ns, dur_ns, depth in trace.spans:
+            events.append({"name": span_name, "ph": "X", "pid": pid, "tid": trace.seq,
+                           "ts": start_ns / 1000, "dur": dur_ns / 1000, "args": {"depth": depth + 1}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def init_app(app):
+    if TRACE_ENABLED:
+        app.before_request(_before_request)
+        app.teardown_request(_teardown_request)
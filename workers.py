@@ -0,0 +1,142 @@
+import os
+import math
+import asyncio
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import jsonify
+
+from config import CPU_POOL_SIZE, CPU_POOL_MAX_QUEUE, CPU_POOL_TIMEOUT_SECONDS
+from tracing import propagate
+
+# =========================================================
+# CPU WORKER POOL + ADMISSION CONTROL
+# งานหนักส่งเข้า pool ขนาดจำกัด ถ้างานค้าง (กำลังรัน + รอคิว) เต็ม -> ปฏิเสธทันทีด้วย 503
+# request ถูก ๆ (เช่น /stage3/flag) เลยไม่โดนแย่ง thread จน timeout
+# =========================================================
+class Overloaded(Exception):
+    def __init__(self, endpoint: str, retry_after: int):
+        super().__init__(f"{endpoint}: worker pool is full")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+class EndpointStats:
+    __slots__ = ("calls", "shed", "wait_total", "wait_max", "service_total", "service_max")
+
+    def __init__(self):
+        self.calls = 0
+        self.shed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.service_total = 0.0
+        self.service_max = 0.0
+
+    def snapshot(self) -> dict:
+        done = self.calls or 1
+        return {
+            "calls": self.calls,
+            "shed": self.shed,
+            "queue_wait_avg_ms": round(self.wait_total / done * 1000, 3),
+            "queue_wait_max_ms": round(self.wait_max * 1000, 3),
+            "service_avg_ms": round(self.service_total / done * 1000, 3),
+            "service_max_ms": round(self.service_max * 1000, 3),
+        }
+
+class CPUPool:
+    def __init__(self, size: int = CPU_POOL_SIZE, max_queue: int = CPU_POOL_MAX_QUEUE,
+                 timeout: float = CPU_POOL_TIMEOUT_SECONDS):
+        self.size = size
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._pending = 0  # กำลังรัน + รอคิว
+        self._lock = threading.Lock()
+        self._stats = {}   # {endpoint: EndpointStats}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # executor สร้างหลัง fork (thread ไม่ตามไปใน process ลูก)
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="cpu-pool")
+            self._pid = os.getpid()
+            self._pending = 0
+        return self._executor
+
+    def _endpoint(self, endpoint: str) -> EndpointStats:
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = self._stats.setdefault(endpoint, EndpointStats())
+        return stats
+
+    def _retry_after(self, stats: EndpointStats) -> int:
+        avg = stats.service_total / stats.calls if stats.calls else 0.1
+        return max(1, math.ceil(avg * (self.size + self.max_queue) / self.size))
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def _submit(self, endpoint: str, fn, args):
+        stats = self._endpoint(endpoint)
+        fn = propagate(fn)  # span ที่รันบน pool ยังนับเข้า trace ของ request เดิม
+        with self._lock:
+            executor = self._get_executor()
+            if self._pending >= self.size + self.max_queue:
+                stats.shed += 1
+                raise Overloaded(endpoint, self._retry_after(stats))
+            self._pending += 1
+        enqueued = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                done = time.perf_counter()
+                wait, service = started - enqueued, done - started
+                with self._lock:
+                    stats.calls += 1
+                    stats.wait_total += wait
+                    stats.service_total += service
+                    stats.wait_max = max(stats.wait_max, wait)
+                    stats.service_max = max(stats.service_max, service)
+
+        future = executor.submit(task)
+        future.add_done_callback(self._release)
+        return stats, future
+
+    def run(self, endpoint: str, fn, *args):
+        """Run fn(*args) on the pool and wait for the result; raise Overloaded if the queue is full."""
+        stats, future = self._submit(endpoint, fn, args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise Overloaded(endpoint, self._retry_after(stats)) from None
+
+    async def run_async(self, endpoint: str, fn, *args):
+        """run() for event-loop callers (asgi.py): awaits the pool instead of blocking the loop."""
+        stats, future = self._submit(endpoint, fn, args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded(endpoint, self._retry_after(stats)) from None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                "endpoints": {name: s.snapshot() for name, s in self._stats.items()},
+            }
+
+CPU_POOL = CPUPool()
+
+def handle_overloaded(e: Overloaded):
+    resp = jsonify({"ok": False, "error": "Server busy, retry later.", "endpoint": e.endpoint})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+def init_app(app):
+    app.register_error_handler(Overloaded, handle_overloaded)
@@ -0,0 +1,12 @@
+from app import create_app
+
+# =========================================================
+# WSGI ENTRY POINT (production)
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#   CTF_OTP_STREAM=0 uwsgi --http :5001 --master --processes 4 --threads 4 --module wsgi:app
+#   (thread pool จำกัด -> ปิด SSE ให้หน้า Layer 4 poll QR แทน; gunicorn.conf.py ตั้งให้เอง)
+# module นี้ถูก import ใน master process (preload_app / uwsgi ไม่ใช้ --lazy-apps)
+# -> blueprint, หน้าที่ render ไว้, key ทั้งหมดถูกสร้างครั้งเดียวแล้ว fork ให้ worker ใช้ร่วมกัน
+# =========================================================
+app = create_app(preload=True)
+application = app  # ชื่อที่ uWSGI / mod_wsgi หาเป็นค่า default